@@ -0,0 +1,49 @@
+"""band_analysis, f_peak and the quarter-wave fits, which all work on the
+in-band cells of the grid"""
+
+import libRL
+
+from libRL.tools.f_peak import f_peak
+from libRL.tools.quarter_wave import power_fn, quarter_wave
+
+from harness import Case
+from synthetic import grid, material
+
+
+def cases(label, n_f, n_d, tmpdir):
+    data = material()
+    f_set, d_set = grid(n_f, n_d)
+    points = n_f * n_d
+    return [
+        Case(
+            "band_analysis/{}".format(label),
+            points,
+            lambda: libRL.band_analysis(
+                data, f_set, d_set, m_set=[1, 2, 3], cache=False
+            ),
+            "band_analysis/{}".format(label),
+        ),
+        Case(
+            "band_analysis[float32]/{}".format(label),
+            points,
+            lambda: libRL.band_analysis(
+                data, f_set, d_set, m_set=[1, 2, 3], dtype="float32", cache=False
+            ),
+            "band_analysis/{}".format(label),
+        ),
+        Case(
+            "f_peak/{}".format(label),
+            points,
+            lambda: f_peak(data, f_set, d_set, cache=False)(1),
+        ),
+        Case(
+            "power_fn/{}".format(label),
+            points,
+            lambda: power_fn(data, f_set, d_set, cache=False)(1),
+        ),
+        Case(
+            "quarter_wave/{}".format(label),
+            n_f,
+            lambda: quarter_wave(data, f_set, cache=False)(1),
+        ),
+    ]
@@ -0,0 +1,27 @@
+"""characterization of every parameter across f_set"""
+
+import libRL
+
+from harness import Case
+from synthetic import grid, material
+
+
+def cases(label, n_f, n_d, tmpdir):
+    data = material()
+    # characterization has no thickness axis, so it's run over n_f * n_d
+    # frequencies to cover the same number of points as the grid benchmarks
+    f_set, _ = grid(n_f * n_d, 1)
+    return [
+        Case(
+            "characterization/{}".format(label),
+            len(f_set),
+            lambda: libRL.characterization(data, f_set, cache=False),
+        ),
+        Case(
+            "characterization[lazy]/{}".format(label),
+            len(f_set),
+            lambda: libRL.characterization(
+                data, f_set, params=["Qe"], lazy=True, cache=False
+            )["Qe"],
+        ),
+    ]
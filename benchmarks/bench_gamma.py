@@ -0,0 +1,76 @@
+"""the native C++ kernels against their python fallbacks in
+tools.redundancies, on identical inputs, and overridden materials against
+the general material on the native gamma_into. Every material now takes the
+same layer kernel, with the override shortcut folded into
+vectorized.layer_terms, so the override group shows what's left of it"""
+
+import numpy as np
+
+from libRL.tools import extensions, redundancies
+from libRL.tools.refactoring import evaluate, interpolations
+
+from harness import Case
+from synthetic import grid, material
+
+# the pure python gamma takes seconds per run on the large grid, and far
+# longer while tracemalloc traces each of its allocations
+PYTHON_GAMMA_LIMIT = 10 ** 5
+
+
+def cases(label, n_f, n_d, tmpdir):
+    f_set, d_set = grid(n_f, n_d)
+    params = [p.tolist() for p in evaluate(interpolations(*material()), f_set)]
+    f_arr, d_arr = np.asarray(f_set), np.asarray(d_set)
+    arrays = [np.asarray(p) for p in params]
+    out = np.empty((n_d, n_f))
+    points = n_f * n_d
+
+    results = [
+        Case(
+            "gamma[native]/{}".format(label),
+            points,
+            lambda: extensions.gamma(f_set, d_set, *params),
+            "gamma/{}".format(label),
+        ),
+        Case(
+            "gamma_into[native]/{}".format(label),
+            points,
+            lambda: extensions.gamma_into(f_arr, d_arr, *arrays, out),
+            "gamma_into/{}".format(label),
+        ),
+        Case(
+            "gamma_into[numpy]/{}".format(label),
+            points,
+            lambda: redundancies.gamma_into(f_arr, d_arr, *arrays, out),
+            "gamma_into/{}".format(label),
+        ),
+    ]
+    if points <= PYTHON_GAMMA_LIMIT:
+        results.append(
+            Case(
+                "gamma[python]/{}".format(label),
+                points,
+                lambda: redundancies.gamma(f_set, d_set, *params),
+                "gamma/{}".format(label),
+            )
+        )
+    results.extend(_override_cases(label, f_set, d_set))
+    return results
+
+
+def _override_cases(label, f_set, d_set):
+    f_arr, d_arr = np.asarray(f_set), np.asarray(d_set)
+    out = np.empty((len(d_arr), len(f_arr)))
+    group = "override/{}".format(label)
+    results = []
+    for override in (None, "x0", "es"):
+        arrays = evaluate(interpolations(*material(), override=override), f_arr)
+        results.append(
+            Case(
+                "gamma_into[native,{}]/{}".format(override or "general", label),
+                out.size,
+                lambda arrays=arrays: extensions.gamma_into(f_arr, d_arr, *arrays, out),
+                group,
+            )
+        )
+    return results
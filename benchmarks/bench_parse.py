@@ -0,0 +1,17 @@
+"""parsing of data files written in the layout of a VNA export"""
+
+import os.path
+
+from libRL.tools.refactoring import parse
+
+from harness import Case
+from synthetic import material, write_csv
+
+
+def cases(label, n_f, n_d, tmpdir):
+    rows = n_f * n_d // 10
+    filepath = os.path.join(tmpdir, "parse_{}.csv".format(label))
+    write_csv(filepath, material(rows))
+    return [
+        Case("parse/{}".format(label), rows, lambda: parse.data(filepath, cache=False)),
+    ]
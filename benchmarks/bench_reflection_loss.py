@@ -0,0 +1,35 @@
+"""reflection_loss over the full f_set x d_set grid"""
+
+import libRL
+
+from harness import Case
+from synthetic import grid, material
+
+
+def cases(label, n_f, n_d, tmpdir):
+    data = material()
+    f_set, d_set = grid(n_f, n_d)
+    points = n_f * n_d
+    return [
+        Case(
+            "reflection_loss[list]/{}".format(label),
+            points,
+            lambda: libRL.reflection_loss(data, f_set, d_set, cache=False),
+        ),
+        Case(
+            "reflection_loss[array]/{}".format(label),
+            points,
+            lambda: libRL.reflection_loss(
+                data, f_set, d_set, output="array", cache=False
+            ),
+            "reflection_loss[array]/{}".format(label),
+        ),
+        Case(
+            "reflection_loss[array,float32]/{}".format(label),
+            points,
+            lambda: libRL.reflection_loss(
+                data, f_set, d_set, output="array", dtype="float32", cache=False
+            ),
+            "reflection_loss[array]/{}".format(label),
+        ),
+    ]
@@ -0,0 +1,116 @@
+"""timing, memory and baseline handling shared by the benchmark modules"""
+
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+from collections import namedtuple
+
+import numpy as np
+
+# a single benchmark. fn takes no arguments and does the timed work, points is
+# the number of grid points (or rows) it covers. Cases with the same group
+# are compared against each other in the report.
+Case = namedtuple("Case", ["name", "points", "fn", "group"], defaults=[None])
+
+Result = namedtuple(
+    "Result", ["name", "points", "seconds", "points_per_second", "peak_mb", "group"]
+)
+
+# grid sizes as (len(f_set), len(d_set))
+SIZES = {
+    "small": (100, 50),
+    "medium": (400, 200),
+    "large": (1600, 800),
+}
+
+
+def measure(case, repeat=3):
+    """best wall time of repeat runs, plus the peak memory traced while
+    running once more. Only allocations made through python (which includes
+    numpy arrays) are traced, not those made inside the C++ extension."""
+    case.fn()  # warm up imports, caches and the allocator
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        case.fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(times)
+    return Result(
+        case.name,
+        case.points,
+        seconds,
+        case.points / seconds if seconds else float("inf"),
+        peak / 2 ** 20,
+        case.group,
+    )
+
+
+def machine():
+    """describes where the results were measured, stored with the baselines"""
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_baselines(filepath):
+    if not os.path.isfile(filepath):
+        return {"machine": None, "results": {}}
+    with open(filepath) as fl:
+        return json.load(fl)
+
+
+def save_baselines(filepath, results, existing=None):
+    """stores results as the baselines, keeping the existing entries of cases
+    which weren't run"""
+    baselines = dict((existing or {}).get("results", {}))
+    for r in results:
+        baselines[r.name] = {
+            "points_per_second": r.points_per_second,
+            "peak_mb": r.peak_mb,
+        }
+    with open(filepath, "w") as fl:
+        json.dump(
+            {"machine": machine(), "results": baselines}, fl, indent=2, sort_keys=True
+        )
+
+
+def regressions(results, baselines, tolerance=0.25):
+    """returns {name: reasons} for each result which is more than tolerance
+    slower, or uses more than tolerance more peak memory, than its baseline"""
+    flagged = {}
+    for r in results:
+        baseline = baselines.get("results", {}).get(r.name)
+        if baseline is None:
+            continue
+        reasons = []
+        if r.points_per_second < baseline["points_per_second"] * (1 - tolerance):
+            reasons.append(
+                "throughput {:.0%} of baseline".format(
+                    r.points_per_second / baseline["points_per_second"]
+                )
+            )
+        # allocations below 1 MB are too small to compare meaningfully
+        if r.peak_mb > max(baseline["peak_mb"] * (1 + tolerance), 1.0):
+            reasons.append(
+                "peak memory {:.1f} MB vs {:.1f} MB".format(
+                    r.peak_mb, baseline["peak_mb"]
+                )
+            )
+        if reasons:
+            flagged[r.name] = reasons
+    return flagged
@@ -0,0 +1,138 @@
+"""libRL benchmark runner.
+
+Times the hot paths of libRL on synthetic material data over a matrix of grid
+sizes, reporting throughput in grid points per second and peak traced memory.
+Results are compared against the stored baselines and any case which is more
+than --tolerance slower, or uses more than --tolerance more memory, is flagged
+and makes the run exit with status 1.
+
+    python benchmarks/run.py                         # every size, compared
+    python benchmarks/run.py --sizes small -k gamma  # a subset
+    python benchmarks/run.py --save                  # update the baselines
+
+The modules are named bench_*.py so that pytest doesn't collect them; each
+exposes cases(label, n_f, n_d, tmpdir) returning a list of harness.Case.
+Baselines are specific to the machine they were measured on, which is stored
+alongside them; regenerate them with --save before comparing elsewhere.
+"""
+
+import argparse
+import glob
+import importlib
+import os
+import sys
+import tempfile
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, HERE)
+
+from harness import (  # noqa: E402
+    SIZES,
+    load_baselines,
+    machine,
+    measure,
+    regressions,
+    save_baselines,
+)
+
+BASELINES = os.path.join(HERE, "baselines.json")
+
+
+def _modules():
+    for filepath in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        yield importlib.import_module(os.path.splitext(os.path.basename(filepath))[0])
+
+
+def _report(results, flagged):
+    width = max(len(r.name) for r in results)
+    lines = [
+        "{:<{w}}  {:>10}  {:>14}  {:>10}".format(
+            "case", "seconds", "points/s", "peak MB", w=width
+        )
+    ]
+    for r in results:
+        lines.append(
+            "{:<{w}}  {:>10.4f}  {:>14,.0f}  {:>10.2f}{}".format(
+                r.name,
+                r.seconds,
+                r.points_per_second,
+                r.peak_mb,
+                (
+                    "  REGRESSION: " + "; ".join(flagged[r.name])
+                    if r.name in flagged
+                    else ""
+                ),
+                w=width,
+            )
+        )
+
+    groups = {}
+    for r in results:
+        if r.group:
+            groups.setdefault(r.group, []).append(r)
+    for group, members in groups.items():
+        slowest = min(m.points_per_second for m in members)
+        lines.append(
+            "{}: ".format(group)
+            + ", ".join(
+                "{} {:.1f}x".format(m.name.split("/")[0], m.points_per_second / slowest)
+                for m in members
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="libRL benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(SIZES),
+        help="grid sizes to run, separated by comma. options are {}".format(
+            ", ".join("{} ({}x{})".format(k, *v) for k, v in SIZES.items())
+        ),
+    )
+    parser.add_argument(
+        "-k", dest="keyword", default="", help="only run cases containing this"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="fraction a case may fall below its baseline before it's flagged",
+    )
+    parser.add_argument("--baselines", default=BASELINES, help="baselines file")
+    parser.add_argument(
+        "--save", action="store_true", help="store the results as the new baselines"
+    )
+    ns = parser.parse_args(args)
+
+    sizes = ns.sizes.split(",")
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        parser.error("unknown sizes: {}".format(sorted(unknown)))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for module in _modules():
+            for label in sizes:
+                for case in module.cases(label, *SIZES[label], tmpdir):
+                    if ns.keyword in case.name:
+                        results.append(measure(case, ns.repeat))
+    if not results:
+        parser.error("no cases matched")
+
+    baselines = load_baselines(ns.baselines)
+    flagged = {} if ns.save else regressions(results, baselines, ns.tolerance)
+    print(_report(results, flagged))
+
+    if baselines["machine"] and baselines["machine"] != machine() and not ns.save:
+        print("warning: baselines were measured on a different machine")
+    if ns.save:
+        save_baselines(ns.baselines, results, baselines)
+        print("saved baselines to {}".format(ns.baselines))
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""synthetic material data for the benchmarks, so they don't depend on any
+measured dataset. The permittivity and permeability follow single-pole Debye
+relaxations, which give smooth curves with a few well-separated absorption
+bands across the usual 1 - 18 GHz range."""
+
+import numpy as np
+
+HEADER = (
+    "Synthetic Debye Material,,,,",
+    "Generated by benchmarks/synthetic.py,,,,",
+    ",,,,",
+    "frequency(GHz),e',e'',u',u''",
+)
+
+
+def material(n_points=341, f_min=1.0, f_max=18.0):
+    """returns [f, e1, e2, mu1, mu2] as float64 arrays over n_points
+    frequencies in GHz"""
+    f = np.linspace(f_min, f_max, n_points)
+    er = 4.0 + (18.0 - 4.0) / (1 + 1j * f / 6.0)
+    mur = 1.0 + (2.5 - 1.0) / (1 + 1j * f / 3.0)
+    return [f, er.real, -er.imag, mur.real, -mur.imag]
+
+
+def write_csv(filepath, data):
+    """writes data in the layout of a VNA export, a few lines of header
+    followed by one row per frequency"""
+    with open(filepath, "w") as fl:
+        fl.write("\n".join(HEADER) + "\n")
+        np.savetxt(fl, np.column_stack(data), delimiter=",", fmt="%.10g")
+
+
+def grid(n_f, n_d, f_min=1.0, f_max=18.0, d_min=0.1, d_max=10.0):
+    """f_set and d_set lists of n_f frequencies and n_d thicknesses"""
+    f_set = np.round(np.linspace(f_min, f_max, n_f), 6).tolist()
+    d_set = np.round(np.linspace(d_min, d_max, n_d), 6).tolist()
+    return f_set, d_set
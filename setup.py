@@ -1,10 +1,21 @@
 import os.path
+import sys
 from setuptools import setup, find_packages, Extension
 
+# std::thread needs pthreads on posix compilers
+thread_flags = [] if sys.platform == "win32" else ["-pthread"]
+
+# the gamma_into kernel relies on auto-vectorization, which needs -O3 (some
+# pythons are built with -O2) and -fno-trapping-math, without which GCC won't
+# turn its selects into branch-free code. Neither changes any result.
+optimize_flags = [] if sys.platform == "win32" else ["-O3", "-fno-trapping-math"]
+
 extensions = [
     Extension(
         "libRL.tools._extensions",
         [os.path.join("src", "libRL", "tools", "_extensions.cpp")],
+        extra_compile_args=thread_flags + optimize_flags,
+        extra_link_args=thread_flags,
     )
 ]
 
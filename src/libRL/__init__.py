@@ -1,3 +1,7 @@
 from .reflection_loss import reflection_loss
 from .characterizations import characterization
 from .band_analysis import band_analysis
+from .batch import batch
+from .tools.optimal_thickness import optimal_thickness
+from .tools.writer import load
+from .tools.refactoring import GridSpec
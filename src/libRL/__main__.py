@@ -1,9 +1,13 @@
 import argparse
 import functools
+import glob
+import os
 import sys
 
 import libRL
+from .tools import profiling
 from .tools.refactoring import parse
+from .tools.writer import reflection_loss_chunks
 
 
 def _fdm_format(_type, string):
@@ -55,7 +59,20 @@ def _saver(parser):
         "--save",
         type=str,
         metavar="",
-        help="filepath to save data at. Directory must exist.",
+        help="filepath to save data at. Directory must exist. Files ending in .npy or .npz are saved as numpy binaries, anything else as csv.",
+        default=None,
+    )
+
+
+def _dtype(parser):
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        metavar="",
+        help=(
+            "precision of the computation, 'float64' (default) or 'float32' "
+            "for faster screening sweeps, accurate to ~0.01 dB above -60 dB"
+        ),
         default=None,
     )
 
@@ -70,6 +87,7 @@ def _reflection_loss_cli(args):
     _f_set(parser)
     _d_set(parser)
     _saver(parser)
+    _dtype(parser)
     parser.add_argument(
         "--override",
         type=str,
@@ -80,8 +98,22 @@ def _reflection_loss_cli(args):
         ),
         default=None,
     )
+    parser.add_argument(
+        "--chunk_d",
+        type=int,
+        metavar="",
+        help=(
+            "stream the results in chunks of this many thicknesses, so large "
+            "grids never have to fit in memory. Rows are written to the save "
+            "path, or to stdout if not given"
+        ),
+        default=None,
+    )
     ns = vars(parser.parse_args(args))
     filepath = ns.pop("filepath")
+    chunk_d = ns.pop("chunk_d")
+    if chunk_d is not None:
+        return _stream_reflection_loss(filepath, chunk_d, **ns)
     results = libRL.reflection_loss(filepath, **ns)
     vals = zip(results["f"], *results["RL"])
     return "\n".join(
@@ -92,6 +124,17 @@ def _reflection_loss_cli(args):
     )
 
 
+def _stream_reflection_loss(filepath, chunk_d, f_set, d_set, save, **kwargs):
+    data = parse.data(filepath)
+    f_set = parse.f_set(f_set, data[0])
+    d_set = parse.d_set(d_set)
+    chunks = libRL.reflection_loss.iter_chunks(
+        data, f_set, d_set, chunk_d=chunk_d, **kwargs
+    )
+    dtype = parse.dtype(kwargs.get("dtype"))
+    reflection_loss_chunks(f_set, d_set, chunks, save or sys.stdout, dtype=dtype)
+
+
 def _bandwidth_analysis_cli(args):
     parser = argparse.ArgumentParser(description="libRL band analysis")
     _filepath(parser)
@@ -99,6 +142,7 @@ def _bandwidth_analysis_cli(args):
     _m_set(parser)
     _f_set(parser)
     _saver(parser)
+    _dtype(parser)
 
     parser.add_argument(
         "-t",
@@ -147,6 +191,76 @@ def _characterization_cli(args):
     return "\n".join((",".join(keys), *(",".join((str(i) for i in v)) for v in vals)))
 
 
+def _batch_cli(args):
+    parser = argparse.ArgumentParser(description="libRL batch")
+    parser.add_argument(
+        "patterns",
+        type=str,
+        nargs="+",
+        metavar="",
+        help="glob pattern(s) of data files, i.e. 'data/*.csv'",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_dir",
+        type=str,
+        metavar="",
+        help="directory to save results in, created if it doesn't exist",
+        required=True,
+    )
+    parser.add_argument(
+        "--modes",
+        type=param_format,
+        metavar="",
+        help="analyses to run, separated by comma. options are 'rl', 'ba' and "
+        "'char'. Default is 'rl,ba'",
+        default=["rl", "ba"],
+    )
+    parser.add_argument(
+        "-j",
+        "--max_workers",
+        type=int,
+        metavar="",
+        help="number of worker processes, default is the number of cores",
+        default=None,
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        metavar="",
+        help="number of files sent to a worker at a time, default is 1",
+        default=1,
+    )
+    _f_set(parser)
+    _d_set(parser)
+    _m_set(parser)
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        metavar="",
+        help="threshold value, default is -10",
+        default=-10,
+    )
+    ns = vars(parser.parse_args(args))
+    sources = sorted(
+        {path for pattern in ns.pop("patterns") for path in glob.glob(pattern)}
+    )
+    os.makedirs(ns["output_dir"], exist_ok=True)
+    return "\n".join(
+        (
+            "source,status",
+            *(
+                "{},{}".format(
+                    res.source,
+                    "ok" if res.error is None else type(res.error).__name__,
+                )
+                for res in libRL.batch(sources, **ns)
+            ),
+        )
+    )
+
+
 def _print_help():
     _help = "\n".join(
         (
@@ -154,7 +268,10 @@ def _print_help():
             "Author: Michael Green, PhD",
             "This tool can be used to calculate the GHz-range electromagnetic "
             "responses of materials. There are three main modes, `rl`, `ba` and "
-            "`char`. Type 'libRL <mode> --help' for more information on each.",
+            "`char`, and a `batch` mode which runs them over many files. Type "
+            "'libRL <mode> --help' for more information on each. "
+            "'libRL --profile <mode> ...' prints the time spent in each stage "
+            "of the run to stderr.",
         )
     )
     print(_help)
@@ -162,12 +279,24 @@ def _print_help():
 
 def main():
     _, cmd, *args = sys.argv
+    if cmd == "--profile":
+        if not args:
+            return _print_help()
+        cmd, *args = args
+        with profiling.enabled():
+            return _main(cmd, args)
+    return _main(cmd, args)
+
+
+def _main(cmd, args):
     if cmd in ("rl", "RL", "reflection_loss"):
         return _reflection_loss_cli(args)
     elif cmd in ("ba", "band_analysis"):
         return _bandwidth_analysis_cli(args)
     elif cmd in ("c", "char", "characterization"):
         return _characterization_cli(args)
+    elif cmd == "batch":
+        return _batch_cli(args)
     elif cmd in ("-h", "--help"):
         return _print_help()
     else:
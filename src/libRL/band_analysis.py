@@ -1,46 +1,355 @@
-import itertools
+import os.path
+
+import numpy as np
+
+from scipy.optimize import minimize_scalar
 
 from .reflection_loss import band_reflection_loss
-from .tools.refactoring import parse
+from .tools.profiling import profiled, session, stage
+from .tools.refactoring import GridSpec, parse, precision
 from .tools.writer import band_analysis as write
 
 
+@profiled("band_analysis")
 def band_analysis(data, f_set=None, d_set=None, m_set=None, threshold=-10, **kwargs):
+    """calculates the bandwidth below threshold of each thickness in d_set for
+    each band in m_set, returned as {m: {d: bandwidth}}. By default every band
+    is computed from a single reflection loss pass; multi_band=False computes
+    each band separately instead.
+
+    threshold may also be a list of thresholds, i.e. [-10, -20, -30], in
+    which case all of them are found from the same pass and the results are
+    keyed by threshold, {threshold: {m: {d: bandwidth}}}. When saving, each
+    threshold is written to its own file with the threshold appended to the
+    filename.
+
+    dtype='float32' evaluates the reflection loss of each cell in single
+    precision, see reflection_loss for its error. Only the cells
+    whose reflection loss lies within that error of the threshold can be
+    counted differently, so bandwidths differ from float64 by at most a few
+    frequency steps, and typically not at all.
+
+    By default (method='count') the bandwidth is the number of cells at or
+    below threshold times the frequency step, rounded to as many decimal
+    places as the step has, so its resolution is the step of f_set. method='interp' instead finds where each thickness row crosses
+    threshold by linear interpolation between neighbouring cells and sums
+    the lengths of the intervals between the crossings, see
+    cell_interpolated_bandwidth; method='root' solves for each crossing on the
+    continuous reflection loss of the interpolants to within xtol GHz
+    (default 1e-6), so a coarse f_set gives the bandwidth of a fine one.
+    With either, intervals=True returns the (start, stop) frequencies of
+    each interval below threshold, {m: {d: [(start, stop), ...]}}, in place
+    of the bandwidths; these can't be saved."""
 
     m_set = parse.m_set(m_set)
+    if kwargs.get("intervals") and kwargs.get("save"):
+        raise ValueError("intervals can't be saved")
     _analysis = _band_analysis(
         data=data, f_set=f_set, d_set=d_set, threshold=threshold, **kwargs
     )
 
-    band_results = {}
-    for m in m_set:
-        band_results[m] = _analysis(m)
+    if kwargs.get("multi_band", True):
+        band_results = _analysis.bands(m_set)
+    else:
+        band_results = {m: _analysis(m) for m in m_set}
+
+    if isinstance(threshold, (list, tuple)):
+        band_results = {
+            t: {m: results[t] for m, results in band_results.items()} for t in threshold
+        }
+
     filename = kwargs.get("save")
     if filename:
         d_set = parse.d_set(d_set)
-        return write(d_set, band_results, filename)
+        if not isinstance(threshold, (list, tuple)):
+            return write(d_set, band_results, filename)
+        root, ext = os.path.splitext(filename)
+        for t, results in band_results.items():
+            write(d_set, results, "{}_{}{}".format(root, t, ext))
+        return None
     return band_results
 
 
+@profiled("band_analysis.optimize")
+def optimize(data, m=1, threshold=-10, d_bounds=None, f_set=None, **kwargs):
+    """finds the thickness within d_bounds (mm) with the widest bandwidth below
+    threshold in band m. The bandwidth of a thickness is found from the
+    reflection loss of its in-band cells, see band_reflection_loss, with
+    method='root' (default) or 'interp' as in band_analysis, which makes it
+    a continuous function of d. d_bounds defaults to the thicknesses band m
+    spans over f_set.
+
+    As bandwidth(d) can have several local maxima, and is flat at 0 where no
+    frequency is below threshold, d_bounds is first scanned at scan
+    (default 16) evenly spaced thicknesses. The best of those is then
+    refined with a bounded scalar search between its neighbours, to within
+    xatol mm (default 1e-4). Returns {'d', 'bandwidth', 'evaluations'},
+    where evaluations is the number of thicknesses the bandwidth was found
+    at."""
+    method = kwargs.get("method", "root")
+    if method not in ("interp", "root"):
+        raise ValueError("method must be either 'interp' or 'root'")
+
+    _band_rl = band_reflection_loss(data, f_set=f_set, d_set=[], **kwargs)
+    engine = _band_rl.engine
+    lower, upper = engine.bounds(m), engine.bounds(m + 1)
+    if d_bounds is None:
+        d_bounds = (np.nanmin(lower), np.nanmax(upper))
+    d_min, d_max = d_bounds
+    if not d_min < d_max:
+        raise ValueError("d_bounds must be an increasing (min, max) pair")
+    surface = engine.surface if method == "root" else None
+    xtol = kwargs.get("xtol", 1e-6)
+    evaluations = 0
+
+    def _bandwidth(d):
+        nonlocal evaluations
+        evaluations += 1
+        rl = engine.at(np.full(len(engine.f), d))
+        with np.errstate(invalid="ignore"):
+            rl[~((lower <= d) & (d <= upper))] = np.nan
+        _, start, stop = band_intervals(
+            rl[np.newaxis], engine.f, threshold, surface, [d], xtol
+        )
+        return float(np.sum(stop - start))
+
+    with session("band_analysis.optimize.scan", kwargs.get("profile")):
+        d_scan = np.linspace(d_min, d_max, kwargs.get("scan", 16))
+        widths = [_bandwidth(d) for d in d_scan]
+    best = int(np.argmax(widths))
+    d_opt, width = d_scan[best].item(), widths[best]
+
+    if width > 0:
+        with session("band_analysis.optimize.refine", kwargs.get("profile")):
+            result = minimize_scalar(
+                lambda d: -_bandwidth(d),
+                bounds=(
+                    d_scan[max(best - 1, 0)],
+                    d_scan[min(best + 1, len(d_scan) - 1)],
+                ),
+                method="bounded",
+                options=dict(xatol=kwargs.get("xatol", 1e-4)),
+            )
+        if -result.fun > width:
+            d_opt, width = float(result.x), -float(result.fun)
+
+    return {"d": d_opt, "bandwidth": width, "evaluations": evaluations}
+
+
+band_analysis.optimize = optimize
+
+
+def cell_bandwidth(rl, d_i, d_set, f_step, thresholds=(-10,), f_precision=None):
+    """bandwidth of each thickness of a band from its in-band cells, see
+    tools.bands.BandEngine, where rl holds their reflection loss and d_i
+    indexes their thickness in d_set. The cells at or below threshold are
+    counted per thickness with bincount, times f_step. Returns
+    {threshold: {d: bandwidth}} for every threshold, holding only the
+    thicknesses with a nonzero bandwidth in ascending order of d. Bandwidths
+    are rounded to f_precision digits if given."""
+    rl, d_i = np.asarray(rl), np.asarray(d_i, dtype=np.intp)
+    order = np.argsort(d_set, kind="stable")
+    d_sorted = np.asarray(d_set, dtype=np.float64)[order].tolist()
+
+    results = {}
+    for t in thresholds:
+        counts = np.bincount(d_i, weights=rl <= t, minlength=len(d_set))
+        results[t] = {
+            d: (
+                count * f_step
+                if f_precision is None
+                else round(count * f_step, f_precision)
+            )
+            for d, count in zip(d_sorted, counts[order].astype(np.intp).tolist())
+            if count
+        }
+    return results
+
+
+def _crossing(f, i, j, v_i, v_j, threshold):
+    # linear interpolation of where rl crosses threshold between f[i] and f[j]
+    return f[i] + (threshold - v_i) / (v_j - v_i) * (f[j] - f[i])
+
+
+def bisect_crossings(surface, above, below, d, threshold, xtol=1e-6):
+    """refines crossings of threshold on the continuous reflection loss
+    surface(f, d) by bisection, run for every crossing at once. The crossing
+    at thickness d[i] is bracketed by the frequencies above[i], where the
+    reflection loss is above threshold, and below[i], where it isn't."""
+    above = np.array(above, dtype=np.float64)
+    below = np.array(below, dtype=np.float64)
+    if not len(above):
+        return above
+    width = np.max(np.abs(above - below))
+    for _ in range(max(0, int(np.ceil(np.log2(width / xtol))))):
+        mid = (above + below) / 2
+        is_below = surface(mid, d) <= threshold
+        below = np.where(is_below, mid, below)
+        above = np.where(is_below, above, mid)
+    return (above + below) / 2
+
+
+def band_intervals(rl, f_set, threshold=-10, surface=None, d_set=None, xtol=1e-6):
+    """the frequency intervals of each thickness row of a (len(d_set),
+    len(f_set)) reflection loss array which lie at or below threshold,
+    returned as (row, start, stop) arrays. Where a run of cells below
+    threshold borders an in-band cell above it, the interval ends where the
+    row crosses threshold between the two, found by linear interpolation.
+    Where it borders a nan (out of band) cell or the end of f_set, the
+    interval ends at the last cell of the run. Given the continuous surface
+    (see tools.bands.surface) and the d_set of the rows, the interpolated
+    crossings are refined on it, see bisect_crossings."""
+    rl = np.asarray(rl, dtype=np.float64)
+    rows, cols = np.nonzero(~np.isnan(rl))
+    return cell_intervals(
+        rl[rows, cols], rows, cols, f_set, threshold, surface, d_set, xtol
+    )
+
+
+def cell_intervals(
+    rl, rows, cols, f_set, threshold=-10, surface=None, d_set=None, xtol=1e-6
+):
+    """band_intervals of the cells (rows, cols) of a reflection loss array,
+    with reflection loss rl, without scattering them onto the array first.
+    Any cell which isn't given is treated as nan, i.e. out of band."""
+    rl = np.asarray(rl, dtype=np.float64)
+    f = np.asarray(f_set, dtype=np.float64)
+    rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+    if not len(rl):
+        return rows, f[cols], f[cols]
+
+    order = np.lexsort((cols, rows))
+    rl, rows, cols = rl[order], rows[order], cols[order]
+    with np.errstate(invalid="ignore"):
+        below = rl <= threshold
+    # whether the next cell in the row is also the next of the sorted cells
+    adjacent = (rows[1:] == rows[:-1]) & (cols[1:] == cols[:-1] + 1)
+    has_before, has_after = np.r_[False, adjacent], np.r_[adjacent, False]
+    first = np.flatnonzero(below & ~(has_before & np.r_[False, below[:-1]]))
+    last = np.flatnonzero(below & ~(has_after & np.r_[below[1:], False]))
+
+    before, after = np.maximum(first - 1, 0), np.minimum(last + 1, len(rl) - 1)
+    opens = has_before[first] & np.isfinite(rl[before])
+    closes = has_after[last] & np.isfinite(rl[after])
+
+    start, stop = f[cols[first]], f[cols[last]]
+    i, j = before[opens], first[opens]
+    start[opens] = _crossing(f, cols[i], cols[j], rl[i], rl[j], threshold)
+    i, j = last[closes], after[closes]
+    stop[closes] = _crossing(f, cols[i], cols[j], rl[i], rl[j], threshold)
+
+    rows = rows[first]
+    if surface is not None:
+        d = np.asarray(d_set, dtype=np.float64)
+        start[opens] = bisect_crossings(
+            surface,
+            f[cols[before[opens]]],
+            f[cols[first[opens]]],
+            d[rows[opens]],
+            threshold,
+            xtol,
+        )
+        stop[closes] = bisect_crossings(
+            surface,
+            f[cols[after[closes]]],
+            f[cols[last[closes]]],
+            d[rows[closes]],
+            threshold,
+            xtol,
+        )
+    return rows, start, stop
+
+
+def cell_interpolated_bandwidth(
+    rl,
+    f_i,
+    d_i,
+    d_set,
+    f_set,
+    thresholds=(-10,),
+    intervals=False,
+    surface=None,
+    xtol=1e-6,
+):
+    """bandwidth of each thickness of a band from its in-band cells, see
+    tools.bands.BandEngine, as the summed length of the intervals below
+    threshold, see cell_intervals. rl holds the reflection loss of the cells
+    and f_i and d_i index their frequency and thickness in f_set and d_set.
+    Returns {threshold: {d: bandwidth}} for every threshold, holding only the
+    thicknesses with at least one interval in ascending order of d, or with
+    intervals=True {threshold: {d: [(start, stop), ...]}}."""
+    order = np.argsort(d_set, kind="stable")
+    d_sorted = np.asarray(d_set, dtype=np.float64)[order]
+    # the row of each cell once the thicknesses are sorted
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    d_rows = rank[np.asarray(d_i, dtype=np.intp)]
+
+    results = {}
+    for t in thresholds:
+        rows, start, stop = cell_intervals(
+            rl, d_rows, f_i, f_set, t, surface, d_sorted, xtol
+        )
+        if intervals:
+            found = {}
+            for row, a, b in zip(rows.tolist(), start.tolist(), stop.tolist()):
+                found.setdefault(d_sorted[row].item(), []).append((a, b))
+            results[t] = found
+        else:
+            widths = np.bincount(rows, weights=stop - start, minlength=len(d_sorted))
+            results[t] = {
+                d_sorted[row].item(): widths[row].item() for row in np.unique(rows)
+            }
+    return results
+
+
 def _band_analysis(data, f_set=None, d_set=None, threshold=-10, **kwargs):
-    data = parse.data(data)
+    data = parse.data(data, kwargs.get("cache", True))
     f, *_ = data
 
-    f_set = parse.f_set(f_set, f)
+    if isinstance(f_set, tuple):
+        f_precision = GridSpec(*f_set).precision
+        f_set = parse.f_set(f_set, f)
+    else:
+        f_set = parse.f_set(f_set, f)
+        f_precision = precision(f_set)
     f_step = (f_set[-1] - f_set[0]) / (len(f_set) - 1)
 
-    precisions = [len(str(x).split(".")[1]) for x in f_set]
-    f_precision = max(set(precisions), key=precisions.count)
-
     _band_rl = band_reflection_loss(data, f_set=f_set, d_set=d_set, **kwargs)
+    engine = _band_rl.engine
+    thresholds = threshold if isinstance(threshold, (list, tuple)) else [threshold]
+
+    method = kwargs.get("method", "count")
+    if method not in ("count", "interp", "root"):
+        raise ValueError("method must be one of 'count', 'interp' or 'root'")
+    if kwargs.get("intervals") and method == "count":
+        raise ValueError("intervals requires method 'interp' or 'root'")
+
+    def _bandwidths(rl, f_i, d_i):
+        with stage("bandwidth", len(rl)):
+            if method == "count":
+                results = cell_bandwidth(
+                    rl, d_i, engine.d, f_step, thresholds, f_precision
+                )
+            else:
+                results = cell_interpolated_bandwidth(
+                    rl,
+                    f_i,
+                    d_i,
+                    engine.d,
+                    engine.f,
+                    thresholds,
+                    kwargs.get("intervals", False),
+                    engine.surface if method == "root" else None,
+                    kwargs.get("xtol", 1e-6),
+                )
+        return results if isinstance(threshold, (list, tuple)) else results[threshold]
 
     def _analysis(m):
-        results = list(filter(lambda x: x[0] <= threshold, _band_rl(m)))
-        results.sort(key=lambda item: item[2])
-        band_results = {}
-        for key, grouper in itertools.groupby(results, key=lambda item: item[2]):
-            values = list(grouper)
-            band_results[key] = round(len(values) * f_step, f_precision)
-        return band_results
+        return _bandwidths(*engine.cells(m))
+
+    def _bands(m_set):
+        return {m: _bandwidths(*cells) for m, cells in engine.bands(m_set).items()}
 
+    _analysis.bands = _bands
     return _analysis
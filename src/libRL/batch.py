@@ -0,0 +1,125 @@
+import os.path
+
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .reflection_loss import reflection_loss
+from .band_analysis import band_analysis
+from .characterizations import characterization
+from .tools.refactoring import parse
+
+BatchResult = namedtuple("BatchResult", ["source", "results", "error"])
+
+_MODES = {
+    "rl": reflection_loss,
+    "ba": band_analysis,
+    "char": characterization,
+}
+
+
+def _name(source, index):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.splitext(os.path.basename(source))[0]
+    return "source_{}".format(index)
+
+
+def _names(sources):
+    """the name each source's files are saved under, see _name. Sources whose
+    names would collide, i.e. a/x.csv and b/x.csv, are told apart by their
+    index, so one can't overwrite another's results."""
+    names = [_name(source, i) for i, source in enumerate(sources)]
+    taken = set()
+    duplicated = {name for name, count in Counter(names).items() if count > 1}
+    unique = []
+    for i, name in enumerate(names):
+        if name in duplicated or name in taken:
+            name = "{}_{}".format(name, i)
+        while name in taken:
+            name += "_"
+        taken.add(name)
+        unique.append(name)
+    return unique
+
+
+def _run(source, name, modes, output_dir, params):
+    results = {}
+    for mode in modes:
+        if output_dir is None:
+            results[mode] = _MODES[mode](source, **params)
+        else:
+            filepath = os.path.join(output_dir, "{}_{}.csv".format(name, mode))
+            _MODES[mode](source, save=filepath, **params)
+            results[mode] = filepath
+    return results
+
+
+def _run_chunk(chunk, modes, output_dir, params):
+    completed = []
+    for index, data, name in chunk:
+        try:
+            completed.append((index, _run(data, name, modes, output_dir, params), None))
+        except Exception as e:
+            completed.append((index, None, e))
+    return completed
+
+
+def batch(
+    sources,
+    modes=("rl", "ba"),
+    output_dir=None,
+    max_workers=None,
+    chunksize=1,
+    **params
+):
+    """runs reflection_loss ('rl'), band_analysis ('ba') and/or
+    characterization ('char') over many data sources in a process pool.
+    params (f_set, d_set, m_set, threshold, interp, override, ...) are shared
+    across every source. Sources are submitted in chunks of chunksize and a
+    generator of BatchResult(source, results, error) is returned which
+    yields in order of completion.
+
+    results is a dict keyed by mode. If output_dir is given, each mode is
+    saved to <output_dir>/<name>_<mode>.csv and results holds the filepaths
+    instead, where name is the filename of the source without its extension,
+    suffixed with the source's index in sources if another source has the
+    same filename. A source which raises has its exception stored on error and
+    does not affect the rest of the batch."""
+    unknown = set(modes) - set(_MODES)
+    if unknown:
+        raise ValueError("unknown batch modes: {}".format(sorted(unknown)))
+    if chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+
+    sources = list(sources)
+    names = _names(sources)
+    jobs, failed = [], []
+    for i, source in enumerate(sources):
+        # file objects don't survive pickling to the workers, so parse them here
+        try:
+            data = (
+                source
+                if isinstance(source, (str, os.PathLike))
+                else parse.data(source)
+            )
+        except Exception as e:
+            failed.append(BatchResult(source, None, e))
+            continue
+        jobs.append((i, data, names[i]))
+    chunks = [jobs[i : i + chunksize] for i in range(0, len(jobs), chunksize)]
+
+    def _results():
+        yield from failed
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_run_chunk, chunk, tuple(modes), output_dir, params): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                try:
+                    completed = future.result()
+                except Exception as e:
+                    completed = [(i, None, e) for i, _, _ in futures[future]]
+                for index, results, error in completed:
+                    yield BatchResult(sources[index], results, error)
+
+    return _results()
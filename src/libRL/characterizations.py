@@ -1,9 +1,12 @@
 import io
 import cmath
+import functools
 
+from collections.abc import Mapping
 
-from numpy import sqrt, pi, array
+from numpy import sqrt, pi, array, asarray, float64, ndarray
 
+from .tools.profiling import profiled, stage
 from .tools.refactoring import parse, interpolations
 from .tools.writer import characterization as write
 
@@ -15,16 +18,28 @@ Z0 = 376.730313461  # intrinsic impedance
 e0 = 8.854188 * 10 ** (-12)  # permittivity of free space
 
 
+@profiled("characterization")
 def characterization(data=None, f_set=None, params=None, **kwargs):
+    """calculates the characterization params across f_set, returned as a
+    dict of lists keyed by param, with f_set under 'f'. lazy=True returns a
+    CharacterizationResult instead, which computes each param as an ndarray
+    on first access."""
     if params is None:
         params = ["all"]
 
-    data = parse.data(data)
+    data = parse.data(data, kwargs.get("cache", True))
 
     f, e1, e2, mu1, mu2 = data
 
     fns = interpolations(
-        f, e1, e2, mu1, mu2, kwargs.get("interp", "cubic"), kwargs.get("override")
+        f,
+        e1,
+        e2,
+        mu1,
+        mu2,
+        kwargs.get("interp", "cubic"),
+        kwargs.get("override"),
+        kwargs.get("cache", True),
     )
     chars = Characterizations(*fns)
 
@@ -35,7 +50,20 @@ def characterization(data=None, f_set=None, params=None, **kwargs):
         raise TypeError("params arg must be 'all' or a list of params")
 
     f_set = parse.f_set(f_set, f)
-    results = {"f": f_set, **{param: chars[param](f_set).tolist() for param in params}}
+    if kwargs.get("lazy"):
+        results = CharacterizationResult(chars, f_set, params)
+        filename = kwargs.get("save")
+        if filename:
+            return write(results.to_dict(), filename)
+        return results
+
+    if kwargs.get("memoize", True):
+        chars = chars.evaluated(f_set)
+    with stage("characterize", len(f_set) * len(params)):
+        results = {
+            "f": f_set,
+            **{param: chars[param](f_set).tolist() for param in params},
+        }
 
     filename = kwargs.get("save")
     if filename:
@@ -43,6 +71,58 @@ def characterization(data=None, f_set=None, params=None, **kwargs):
     return results
 
 
+class CharacterizationResult(Mapping):
+    """a read-only mapping of characterization results which computes each
+    param on first access and caches it. 'f' is f_set as a float64 ndarray
+    and every param is a read-only float64 ndarray over it, returned without
+    copying. Params share their intermediates, see
+    Characterizations.evaluated. to_dict returns the lists that
+    characterization returns by default."""
+
+    def __init__(self, chars, f_set, params):
+        unknown = [p for p in params if p not in chars._CHARACTERIZATION_MAPPING]
+        if unknown:
+            raise KeyError(unknown[0])
+        self.f = asarray(f_set, dtype=float64)
+        self.f.flags.writeable = False
+        self._chars = chars.evaluated(self.f)
+        self._params = list(params)
+        self._columns = {}
+
+    def __getitem__(self, key):
+        if key == "f":
+            return self.f
+        if key not in self._params:
+            raise KeyError(key)
+        if key not in self._columns:
+            with stage("characterize", len(self.f)):
+                column = asarray(self._chars[key](self.f), dtype=float64)
+            column.flags.writeable = False
+            self._columns[key] = column
+        return self._columns[key]
+
+    def __iter__(self):
+        return iter(["f", *self._params])
+
+    def __len__(self):
+        return len(self._params) + 1
+
+    def __repr__(self):
+        computed = ", ".join(self._columns) or "none"
+        return "<CharacterizationResult params={} computed={}>".format(
+            self._params, computed
+        )
+
+    @property
+    def computed(self):
+        """the params computed so far"""
+        return list(self._columns)
+
+    def to_dict(self):
+        """computes every param, returning {'f': [...], param: [...], ...}"""
+        return {key: self[key].tolist() for key in self}
+
+
 class Characterizations:
     _CHARACTERIZATION_MAPPING = {
         "tgde": "tgde",
@@ -72,6 +152,12 @@ class Characterizations:
     def __getitem__(self, attr):
         return self.__getattribute__(self._CHARACTERIZATION_MAPPING[attr])
 
+    def evaluated(self, f):
+        """returns a version of self for which the four interpolants and the
+        intermediates shared between parameters are evaluated at most once
+        for f, see MemoizedCharacterizations"""
+        return MemoizedCharacterizations(self, f)
+
     def _attenuation_and_phase(self, f):
         return self._angular_frequency(f) * self._refractive_index(f) * (c ** -1)
 
@@ -128,3 +214,56 @@ class Characterizations:
 
     def eddy_current(self, f):
         return self.mu2f(f) / (self.mu1f(f) ** 2 * f)
+
+
+class MemoizedCharacterizations(Characterizations):
+    """Characterizations bound to a single frequency set f. The interpolants,
+    the complex refractive index, the angular frequency and the parameters
+    which others are derived from are evaluated once for f and reused by
+    every parameter, so computing all of them runs each interpolant once.
+    The arithmetic is unchanged, so results are identical to
+    Characterizations. Calls with anything other than f itself (by identity)
+    are computed as usual. Memoized arrays are read-only."""
+
+    def __init__(self, chars, f):
+        self.f = f
+        self._memo = {}
+        super().__init__(
+            *(
+                functools.partial(self._once, name, fn)
+                for name, fn in (
+                    ("e1f", chars.e1f),
+                    ("e2f", chars.e2f),
+                    ("mu1f", chars.mu1f),
+                    ("mu2f", chars.mu2f),
+                )
+            )
+        )
+
+    def _once(self, name, fn, f):
+        if f is not self.f:
+            return fn(f)
+        if name not in self._memo:
+            value = fn(f)
+            if isinstance(value, ndarray):
+                value.flags.writeable = False
+            self._memo[name] = value
+        return self._memo[name]
+
+    def _refractive_index(self, f):
+        return self._once("n", super()._refractive_index, f)
+
+    def _angular_frequency(self, f):
+        return self._once("w", super()._angular_frequency, f)
+
+    def _attenuation_and_phase(self, f):
+        return self._once("gamma", super()._attenuation_and_phase, f)
+
+    def real_refractive_index(self, f):
+        return self._once("ReRefIndx", super().real_refractive_index, f)
+
+    def attenuation_constant_per_nm(self, f):
+        return self._once("AtnuCnstNm", super().attenuation_constant_per_nm, f)
+
+    def phase_constant(self, f):
+        return self._once("PhsCnst", super().phase_constant, f)
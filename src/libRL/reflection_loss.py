@@ -1,13 +1,45 @@
 import itertools
+import os.path
 
-from .tools.extensions import gamma
-from .tools.refactoring import parse, interpolations, dfind_half
-from .tools.writer import reflection_loss as write
+import numpy as np
 
+from .tools.extensions import gamma, gamma_into
+from .tools.adaptive import adaptive_grid
+from .tools.bands import BandEngine, surface
+from .tools.profiling import finish, profiled, session, stage, start
+from .tools.refactoring import parse, interpolations, evaluate
+from .tools.writer import load, reflection_loss as write, reflection_loss_chunks
 
+
+@profiled("reflection_loss")
 def reflection_loss(data, f_set=None, d_set=None, **kwargs):
+    """calculates the reflection loss of a dataset across the grid f_set x
+    d_set, returned as {'f': [...], 'd': [...], 'RL': [[...], ...]} with one
+    RL row per thickness. output='array' returns ndarrays instead, with RL of
+    shape (len(d), len(f)), filled in place if a buffer is passed as out=.
+    The array grid agrees with the list output to within rounding.
+
+    n_threads sets the threads of the native kernel, defaulting to the
+    LIBRL_NUM_THREADS environment variable or 1; 0 or 'auto' uses every core.
+
+    output='adaptive' refines the coarse f_set x d_set grid only where the
+    reflection loss varies by more than tol dB or crosses threshold, and
+    returns a tools.adaptive.AdaptiveGrid. Its bandwidths are approximate,
+    so use output='array' where exact ones are needed; it can't be saved.
+
+    save='<path>' writes the result as '.npy', '.npz' or csv, see
+    tools.writer.reflection_loss. With a '.npy' path, mmap=True computes the
+    grid in chunks of chunk_d thicknesses straight into the memory-mapped
+    file, see iter_chunks.
 
-    data = parse.data(data)
+    dtype='float32' computes and returns RL in single precision, halving
+    the memory of large screening sweeps; its error grows as RL falls, to a
+    few thousandths of a dB at -60 dB. '.npy' files stay float64.
+
+    profile= records the time spent in each stage of the run, see
+    tools.profiling.session."""
+
+    data = parse.data(data, kwargs.get("cache", True))
 
     f, e1, e2, mu1, mu2 = data
 
@@ -15,14 +47,82 @@ def reflection_loss(data, f_set=None, d_set=None, **kwargs):
     d_set = parse.d_set(d_set)
 
     fns = interpolations(
-        f, e1, e2, mu1, mu2, kwargs.get("interp", "cubic"), kwargs.get("override")
+        f,
+        e1,
+        e2,
+        mu1,
+        mu2,
+        kwargs.get("interp", "cubic"),
+        kwargs.get("override"),
+        kwargs.get("cache", True),
     )
 
-    rl_vals = gamma(f_set, d_set, *[list(map(fn, f_set)) for fn in fns])
-    result_grid = [
-        [rl for (rl, _, _) in grouper]
-        for _, grouper in itertools.groupby(rl_vals, key=lambda item: item[2])
-    ]
+    n_threads = parse.n_threads(kwargs.get("n_threads"))
+    dtype = parse.dtype(kwargs.get("dtype"))
+
+    if kwargs.get("mmap"):
+        filename = kwargs.get("save")
+        if not filename or os.path.splitext(filename)[1].lower() != ".npy":
+            raise ValueError("mmap requires save to be a '.npy' filepath")
+        chunks = iter_chunks(data, f_set, d_set, **kwargs)
+        reflection_loss_chunks(f_set, d_set, chunks, filename, dtype=dtype)
+        return load(filename)
+
+    output = kwargs.get("output", "list")
+    if output == "array":
+        f_arr = np.asarray(f_set, dtype=np.float64)
+        d_arr = np.asarray(d_set, dtype=np.float64)
+        rl_grid = kwargs.get("out")
+        if rl_grid is None:
+            rl_grid = np.empty((len(d_arr), len(f_arr)), dtype=dtype)
+        elif rl_grid.shape != (len(d_arr), len(f_arr)):
+            raise ValueError("out must be of shape (len(d_set), len(f_set))")
+        elif rl_grid.dtype != dtype:
+            raise ValueError("out must be of dtype {}".format(dtype))
+        params = evaluate(fns, f_arr)
+        with stage("gamma", rl_grid.size):
+            _gamma_into(f_arr, d_arr, params, rl_grid, n_threads)
+        results = {"f": f_arr, "d": d_arr, "RL": rl_grid}
+        filename = kwargs.get("save")
+        if filename:
+            write(results, filename)
+        return results
+    if output == "adaptive":
+        if kwargs.get("save"):
+            raise ValueError("save is not supported with output='adaptive'")
+        return adaptive_grid(
+            lambda f_cells, d_cells: surface(fns, f_cells, d_cells, n_threads),
+            f_set,
+            d_set,
+            tol=kwargs.get("tol", 1.0),
+            threshold=kwargs.get("threshold", -10),
+            max_depth=kwargs.get("max_depth", 4),
+        )
+    if output != "list":
+        raise ValueError("output must be one of 'list', 'array' or 'adaptive'")
+
+    if dtype != np.float64:
+        f_arr = np.asarray(f_set, dtype=np.float64)
+        d_arr = np.asarray(d_set, dtype=np.float64)
+        rl_grid = np.empty((len(d_arr), len(f_arr)), dtype=dtype)
+        params = evaluate(fns, f_arr)
+        with stage("gamma", rl_grid.size):
+            _gamma_into(f_arr, d_arr, params, rl_grid, n_threads)
+        results = {"f": f_set, "d": d_set, "RL": rl_grid.tolist()}
+        filename = kwargs.get("save")
+        if filename:
+            write(results, filename)
+        return results
+
+    with stage("interpolate.evaluate", len(f_set)):
+        params = [list(map(fn, f_set)) for fn in fns]
+    with stage("gamma", len(f_set) * len(d_set)):
+        rl_vals = gamma(f_set, d_set, *params, n_threads)
+    with stage("group", len(rl_vals)):
+        result_grid = [
+            [rl for (rl, _, _) in grouper]
+            for _, grouper in itertools.groupby(rl_vals, key=lambda item: item[2])
+        ]
     results = {"f": f_set, "d": d_set, "RL": result_grid}
     filename = kwargs.get("save")
     if filename:
@@ -30,8 +130,77 @@ def reflection_loss(data, f_set=None, d_set=None, **kwargs):
     return results
 
 
+def iter_chunks(data, f_set=None, d_set=None, chunk_d=256, **kwargs):
+    """streaming version of reflection_loss for grids too large to hold in
+    memory. Yields (d_slice, rl_block) pairs for consecutive slices of at
+    most chunk_d thicknesses, where rl_block is a float64 ndarray of shape
+    (len(d_slice), len(f_set)), so peak memory is bounded by chunk_d rather
+    than by len(d_set). Accepts the same keyword arguments as
+    reflection_loss. tools.writer.reflection_loss_chunks writes the chunks
+    to csv as they arrive."""
+    if chunk_d < 1:
+        raise ValueError("chunk_d must be a positive integer")
+
+    # the profile isn't kept active across yields, as the consumer's code runs
+    # in between; each chunk is recorded into it on its own instead
+    option = kwargs.get("profile")
+    profile = start(option)
+
+    with session("reflection_loss.iter_chunks", profile or option):
+        data = parse.data(data, kwargs.get("cache", True))
+
+        f, e1, e2, mu1, mu2 = data
+
+        f_arr = np.asarray(parse.f_set(f_set, f), dtype=np.float64)
+        d_arr = np.asarray(parse.d_set(d_set), dtype=np.float64)
+
+        fns = interpolations(
+            f,
+            e1,
+            e2,
+            mu1,
+            mu2,
+            kwargs.get("interp", "cubic"),
+            kwargs.get("override"),
+            kwargs.get("cache", True),
+        )
+        params = evaluate(fns, f_arr)
+        n_threads = parse.n_threads(kwargs.get("n_threads"))
+        dtype = parse.dtype(kwargs.get("dtype"))
+
+    # finished even if the consumer stops early or raises, i.e. on close()
+    try:
+        for start_d in range(0, len(d_arr), chunk_d):
+            d_slice = d_arr[start_d : start_d + chunk_d]
+            rl_block = np.empty((len(d_slice), len(f_arr)), dtype=dtype)
+            with session("reflection_loss.iter_chunks", profile or option):
+                with stage("gamma", rl_block.size):
+                    _gamma_into(f_arr, d_slice, params, rl_block, n_threads)
+            yield d_slice, rl_block
+    finally:
+        finish(profile, option)
+
+
+reflection_loss.iter_chunks = iter_chunks
+
+
+def _gamma_into(f_arr, d_arr, params, out, n_threads):
+    if out.dtype != np.float64:
+        # the native kernel computes in the precision of its buffers
+        f_arr, d_arr, *params = (
+            np.ascontiguousarray(p, dtype=out.dtype) for p in (f_arr, d_arr, *params)
+        )
+    return gamma_into(f_arr, d_arr, *params, out, True, n_threads)
+
+
+@profiled("band_reflection_loss")
 def band_reflection_loss(data, f_set=None, d_set=None, **kwargs):
-    data = parse.data(data)
+    """a closure for calculating the reflection loss within a response band.
+    Returns a function which takes m as input, and returns a list of lists
+    formatted [RL, f, d] for each cell between the quarter-wave bounds of
+    bands m and m + 1. The underlying BandEngine is available as
+    getattr(fn, 'engine')"""
+    data = parse.data(data, kwargs.get("cache", True))
 
     f, e1, e2, mu1, mu2 = data
 
@@ -39,19 +208,28 @@ def band_reflection_loss(data, f_set=None, d_set=None, **kwargs):
     d_set = parse.d_set(d_set)
 
     fns = interpolations(
-        f, e1, e2, mu1, mu2, kwargs.get("interp", "cubic"), kwargs.get("override")
+        f,
+        e1,
+        e2,
+        mu1,
+        mu2,
+        kwargs.get("interp", "cubic"),
+        kwargs.get("override"),
+        kwargs.get("cache", True),
+    )
+    engine = BandEngine(
+        f_set,
+        d_set,
+        fns,
+        parse.n_threads(kwargs.get("n_threads")),
+        parse.dtype(kwargs.get("dtype")),
     )
 
     def _results(m):
-        results = []
-        for f in f_set:
-            d_min = dfind_half(*fns, f, m)
-            d_max = dfind_half(*fns, f, m + 1)
-            d_vals = [d for d in d_set if d_min <= d <= d_max]
-            reflection_loss_values = gamma(
-                [f], d_vals, *[list(map(fn, [f])) for fn in fns]
-            )
-            results.extend(reflection_loss_values)
-        return results
+        with session("band_reflection_loss.band", kwargs.get("profile")):
+            rl, f_i, d_i = engine.cells(m)
+            cells = zip(rl.tolist(), engine.f[f_i].tolist(), engine.d[d_i].tolist())
+            return [list(cell) for cell in cells]
 
+    _results.engine = engine
     return _results
@@ -11,32 +11,441 @@ to be full Cpp, but for now it works fine.
 #include <cmath>
 #include <iostream>
 #include <complex>
+#include <cstdint>
+#include <cstring>
+#include <limits>
+#include <system_error>
+#include <thread>
+#include <vector>
 
 using namespace std;
 
-double reflection_loss(
-    double f, double d, double e1, double e2, double mu1, double mu2
-    ){
+/*
+T is double or float. float runs the whole kernel in complex<float>, for
+screening sweeps which don't need double precision; the double instantiation
+performs exactly the same operations as before it was templated.
+*/
+/*
+the principal square root. the double kernel keeps its original pow(x, 0.5)
+so its results don't change; sqrt is several times faster for complex<float>
+*/
+inline complex<double> root(complex<double> x){
+    return pow(x, 0.5);
+};
+
+inline complex<float> root(complex<float> x){
+    return sqrt(x);
+};
+
+
+template <typename T>
+T reflection_loss(T f, T d, T e1, T e2, T mu1, T mu2){
 
-    complex<double> er(e1, -1*e2);
-    complex<double> mur(mu1, -1*mu2);
-    complex<double> j(0.0, 1.0);
-    complex<double> cnsts(
-        2.0*M_PI*(f*pow(10.0,9.0))*(d*pow(10.0,-3.0))/299792458.0, 0.0
+    const T one = 1.0;
+    complex<T> er(e1, -1*e2);
+    complex<T> mur(mu1, -1*mu2);
+    complex<T> j(0.0, 1.0);
+    complex<T> cnsts(
+        (T) (2.0*M_PI)*(f*(T) pow(10.0,9.0))*(d*(T) pow(10.0,-3.0))/(T) 299792458.0,
+        0.0
     );
-    complex<double> rl = 20.0 * log10(
+    T rl = (T) 20.0 * log10(
         abs(
-           ((pow(mur/er, 0.5) * tanh(j*cnsts*pow(er*mur,0.5)))-1.0)
-           /((pow(mur/er,0.5) * tanh(j*cnsts*pow(er*mur,0.5)))+1.0) 
+           ((root(mur/er) * tanh(j*cnsts*root(er*mur)))-one)
+           /((root(mur/er) * tanh(j*cnsts*root(er*mur)))+one)
         )
     );
-    return rl.real();
+    return rl;
+};
+
+
+/*
+splits [0, length) into contiguous blocks, one per worker thread, and calls
+fn(start, stop) on each. every item is still evaluated by the same scalar
+function regardless of which thread owns it, so results are bit-identical
+to the serial path. n_threads is clamped to length and MAX_THREADS; if a
+thread can't be started, the calling thread runs the remaining blocks
+itself, as the GIL is released here and no Python exception can be set.
+*/
+const int MAX_THREADS = 256;  // as in vectorized.MAX_THREADS
+
+template <typename F>
+void parallel_blocks(Py_ssize_t length, int n_threads, F fn) {
+
+    if (n_threads > MAX_THREADS){
+        n_threads = MAX_THREADS;
+    };
+    if (n_threads > length){
+        n_threads = (int) length;
+    };
+    if (n_threads <= 1){
+        fn((Py_ssize_t) 0, length);
+        return;
+    };
+
+    vector<thread> workers;
+    workers.reserve(n_threads);
+    Py_ssize_t block = length / n_threads;
+    Py_ssize_t remainder = length % n_threads;
+    Py_ssize_t start = 0;
+    for (int t = 0; t < n_threads; t++){
+        Py_ssize_t stop = start + block + (t < remainder ? 1 : 0);
+        try {
+            workers.emplace_back(fn, start, stop);
+        } catch (const system_error &) {
+            fn(start, length);
+            break;
+        };
+        start = stop;
+    };
+    for (auto &worker : workers){
+        worker.join();
+    };
+};
+
+
+template <typename T>
+void Cgamma_into(
+    const T *f, const T *d, const T *e1, const T *e2,
+    const T *mu1, const T *mu2, T *out,
+    Py_ssize_t f_length, Py_ssize_t d_length, int n_threads
+    ) {
+
+    parallel_blocks(d_length, n_threads, [=](Py_ssize_t start, Py_ssize_t stop){
+        for (Py_ssize_t i = start; i < stop; i++){
+            T *row = out + i*f_length;
+            for (Py_ssize_t j = 0; j < f_length; j++){
+                row[j] = reflection_loss(f[j], d[i], e1[j], e2[j], mu1[j], mu2[j]);
+            };
+        };
+    });
+};
+
+
+template <typename T>
+void Cgamma_cells(
+    const T *f, const T *d, const T *e1, const T *e2,
+    const T *mu1, const T *mu2, T *out,
+    Py_ssize_t length, int n_threads
+    ) {
+
+    parallel_blocks(length, n_threads, [=](Py_ssize_t start, Py_ssize_t stop){
+        for (Py_ssize_t k = start; k < stop; k++){
+            out[k] = reflection_loss(f[k], d[k], e1[k], e2[k], mu1[k], mu2[k]);
+        };
+    });
+};
+
+
+/*
+the grid kernel behind gamma_into. Rewriting tanh in terms of exp(-2kd), the
+reflection of the metal-backed layer is
+
+    (g - E) / (1 - g*E),  E = exp(-2kd),  g = (z - 1) / (z + 1)
+
+where g, the reflection of the air-material interface, and -2k depend only
+on frequency. They are found once per frequency in layer_terms, after which
+each cell costs one real exp, one sincos and one real log, as
+RL = 10*log10(|g - E|^2 / |1 - g*E|^2) needs no complex log10, sqrt or
+division. exp, sincos and log are written out below without branches or
+library calls so the loop over frequency vectorizes; with GCC on x86-64 the
+row function is compiled for AVX-512, AVX2 and baseline SSE2, and the best
+one the CPU supports is picked when the module is loaded. Results agree with
+the scalar reflection_loss to within rounding (~1e-12 dB), rather than
+exactly; gamma and gamma_cells keep the scalar kernel.
+*/
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__) \
+    && defined(__linux__) && defined(__GLIBC__)
+#define SIMD_CLONES __attribute__((target_clones("avx512f", "avx2", "default")))
+#else
+#define SIMD_CLONES
+#endif
+
+#if defined(__GNUC__)
+#define ALWAYS_INLINE inline __attribute__((always_inline))
+#else
+#define ALWAYS_INLINE inline
+#endif
+
+
+template <typename T> struct float_bits;
+
+template <> struct float_bits<double> {
+    typedef int64_t integer;
+    typedef uint64_t unsigned_integer;
+    static constexpr int mantissa = 52;
+    static constexpr integer bias = 1023;
+    // adding then subtracting 1.5 * 2^52 rounds to the nearest integer
+    static constexpr double round = 6755399441055744.0;
+    static constexpr double tiny = 2.2250738585072014e-308;
+    // the largest |x| whose exp(x) has a normal exponent, with margin
+    static constexpr double max_exp = 700.0;
+    // ln(2) and pi/2 split so that n * hi is exact, from cephes
+    static constexpr double ln2_hi = 6.93145751953125e-1;
+    static constexpr double ln2_lo = 1.42860682030941723212e-6;
+    static constexpr double pio2_1 = 1.57079625129699707031e0;
+    static constexpr double pio2_2 = 7.54978941586159635335e-8;
+    static constexpr double pio2_3 = 5.39030285815811905290e-15;
+};
+
+template <> struct float_bits<float> {
+    typedef int32_t integer;
+    typedef uint32_t unsigned_integer;
+    static constexpr int mantissa = 23;
+    static constexpr integer bias = 127;
+    static constexpr float round = 12582912.0f;
+    static constexpr float tiny = 1.17549435e-38f;
+    static constexpr float max_exp = 87.0f;
+    static constexpr float ln2_hi = 0.693359375f;
+    static constexpr float ln2_lo = -2.12194440e-4f;
+    static constexpr float pio2_1 = 1.5703125f;
+    static constexpr float pio2_2 = 4.837512969970703125e-4f;
+    static constexpr float pio2_3 = 7.54978995489188216e-8f;
+};
+
+
+template <typename T>
+ALWAYS_INLINE typename float_bits<T>::integer to_bits(T x){
+    typename float_bits<T>::integer i;
+    memcpy(&i, &x, sizeof(T));
+    return i;
+};
+
+template <typename T>
+ALWAYS_INLINE T from_bits(typename float_bits<T>::integer i){
+    T x;
+    memcpy(&x, &i, sizeof(T));
+    return x;
+};
+
+
+// exp(x) for |x| <= float_bits<T>::max_exp, to within an ulp or two
+template <typename T>
+ALWAYS_INLINE T simd_exp(T x){
+    typedef float_bits<T> B;
+    T t = x * (T) 1.4426950408889634 + B::round;
+    T n = t - B::round;
+    typename B::integer k = to_bits(t) - to_bits(B::round);
+    T r = (x - n * B::ln2_hi) - n * B::ln2_lo;
+
+    // Taylor series of exp(r), |r| <= ln(2) / 2
+    T p = (T) (1.0 / 6227020800.0);
+    p = p * r + (T) (1.0 / 479001600.0);
+    p = p * r + (T) (1.0 / 39916800.0);
+    p = p * r + (T) (1.0 / 3628800.0);
+    p = p * r + (T) (1.0 / 362880.0);
+    p = p * r + (T) (1.0 / 40320.0);
+    p = p * r + (T) (1.0 / 5040.0);
+    p = p * r + (T) (1.0 / 720.0);
+    p = p * r + (T) (1.0 / 120.0);
+    p = p * r + (T) (1.0 / 24.0);
+    p = p * r + (T) (1.0 / 6.0);
+    p = p * r + (T) 0.5;
+    p = p * r + (T) 1.0;
+    p = p * r + (T) 1.0;
+    return p * from_bits<T>((k + B::bias) << B::mantissa);
+};
+
+
+// sin(x) and cos(x) for |x| up to ~1e8 (double) or ~1e4 (float)
+template <typename T>
+ALWAYS_INLINE void simd_sincos(T x, T &sin_x, T &cos_x){
+    typedef float_bits<T> B;
+    T t = x * (T) 0.63661977236758134 + B::round;
+    T q = t - B::round;
+    typename B::integer quadrant = to_bits(t) - to_bits(B::round);
+    T r = ((x - q * B::pio2_1) - q * B::pio2_2) - q * B::pio2_3;
+    T r2 = r * r;
+
+    // Taylor series of sin and cos, |r| <= pi / 4
+    T s = (T) (-1.0 / 1307674368000.0);
+    s = s * r2 + (T) (1.0 / 6227020800.0);
+    s = s * r2 + (T) (-1.0 / 39916800.0);
+    s = s * r2 + (T) (1.0 / 362880.0);
+    s = s * r2 + (T) (-1.0 / 5040.0);
+    s = s * r2 + (T) (1.0 / 120.0);
+    s = s * r2 + (T) (-1.0 / 6.0);
+    s = r + r * r2 * s;
+
+    T c = (T) (1.0 / 20922789888000.0);
+    c = c * r2 + (T) (-1.0 / 87178291200.0);
+    c = c * r2 + (T) (1.0 / 479001600.0);
+    c = c * r2 + (T) (-1.0 / 3628800.0);
+    c = c * r2 + (T) (1.0 / 40320.0);
+    c = c * r2 + (T) (-1.0 / 720.0);
+    c = c * r2 + (T) (1.0 / 24.0);
+    c = c * r2 + (T) (-0.5);
+    c = (T) 1.0 + r2 * c;
+
+    bool swap = quadrant & 1;
+    T sin_r = swap ? c : s;
+    T cos_r = swap ? s : c;
+    T neg_sin_r = -sin_r;
+    T neg_cos_r = -cos_r;
+    sin_x = (quadrant & 2) ? neg_sin_r : sin_r;
+    cos_x = ((quadrant + 1) & 2) ? neg_cos_r : cos_r;
+};
+
+
+// ln(x) for x >= 0, including 0, inf and nan
+template <typename T>
+ALWAYS_INLINE T simd_log(T x){
+    typedef float_bits<T> B;
+    typedef typename B::integer I;
+    typedef typename B::unsigned_integer U;
+    const U one = to_bits((T) 1.0);
+    const U mantissa_mask = (((U) 1) << B::mantissa) - 1;
+
+    // the selects below pick between values which are always computed, so
+    // the loop has no branches. shifts are unsigned and the exponent is
+    // converted to T through the rounding constant, as AVX2 has neither
+    // 64-bit arithmetic shifts nor 64-bit integer to double conversions
+    bool subnormal = x < B::tiny;
+    T scaled = x * (T) 18014398509481984.0;  // 2^54
+    U bits = (U) to_bits(subnormal ? scaled : x);
+    I e = (I) (bits >> B::mantissa) - B::bias - (subnormal ? 54 : 0);
+    T m = from_bits<T>((I) ((bits & mantissa_mask) | one));
+    bool high = m > (T) 1.4142135623730951;
+    T half_m = m * (T) 0.5;
+    m = high ? half_m : m;
+    I k = high ? e + 1 : e;
+    T exponent = from_bits<T>(to_bits(B::round) + k) - B::round;
+
+    // ln(m) = 2 atanh(s), |s| <= 0.172
+    T s = (m - (T) 1.0) / (m + (T) 1.0);
+    T z = s * s;
+    T p = (T) (1.0 / 23.0);
+    p = p * z + (T) (1.0 / 21.0);
+    p = p * z + (T) (1.0 / 19.0);
+    p = p * z + (T) (1.0 / 17.0);
+    p = p * z + (T) (1.0 / 15.0);
+    p = p * z + (T) (1.0 / 13.0);
+    p = p * z + (T) (1.0 / 11.0);
+    p = p * z + (T) (1.0 / 9.0);
+    p = p * z + (T) (1.0 / 7.0);
+    p = p * z + (T) (1.0 / 5.0);
+    p = p * z + (T) (1.0 / 3.0);
+    p = p * z + (T) 1.0;
+    T result = exponent * (T) 0.69314718055994531 + (T) 2.0 * s * p;
+
+    const T inf = numeric_limits<T>::infinity();
+    const T neg_inf = -inf;
+    result = x == (T) 0.0 ? neg_inf : result;
+    result = x == inf ? x : result;
+    return x != x ? x : result;
+};
+
+
+/*
+the per-frequency terms of a row, structure-of-arrays so the row loop
+reads them contiguously. E is evaluated as exp(alpha*d) * (cos + i sin)
+(beta*d); for a gaining material, whose E would grow with d, 1/E is used
+instead, as |1 - g/E|^2 / |g - 1/E|^2 is the same ratio inverted, and scale
+flips its sign.
+*/
+template <typename T>
+struct layer_terms {
+    vector<T> g_real, g_imag, alpha, beta, scale;
+
+    layer_terms(
+        const T *f, const T *e1, const T *e2, const T *mu1, const T *mu2,
+        Py_ssize_t length
+        ) : g_real(length), g_imag(length), alpha(length), beta(length),
+            scale(length) {
+
+        const double to_db = 10.0 / log(10.0);
+        for (Py_ssize_t j = 0; j < length; j++){
+            complex<double> er(e1[j], -1.0*e2[j]);
+            complex<double> mur(mu1[j], -1.0*mu2[j]);
+            complex<double> n = sqrt(er*mur);
+            complex<double> z = sqrt(mur/er);
+            complex<double> g = (z - 1.0) / (z + 1.0);
+            double w = 2.0*M_PI*(f[j]*1e9)/299792458.0*1e-3;
+            // -2k per mm of thickness, k = i*n*w
+            double a = 2.0*n.imag()*w;
+            double b = -2.0*n.real()*w;
+            bool gaining = a > 0;
+            g_real[j] = (T) g.real();
+            g_imag[j] = (T) g.imag();
+            alpha[j] = (T) (gaining ? -a : a);
+            beta[j] = (T) (gaining ? -b : b);
+            scale[j] = (T) (gaining ? -to_db : to_db);
+        };
+    };
+};
+
+
+template <typename T>
+ALWAYS_INLINE void layer_row_body(
+    const T *__restrict g_real, const T *__restrict g_imag,
+    const T *__restrict alpha, const T *__restrict beta,
+    const T *__restrict scale, T d, T *__restrict row, Py_ssize_t length
+    ) {
+
+    for (Py_ssize_t j = 0; j < length; j++){
+        T x = alpha[j] * d;
+        const T limit = float_bits<T>::max_exp;
+        x = x < -limit ? -limit : (x > limit ? limit : x);
+        T magnitude = simd_exp(x);
+        T sin_y, cos_y;
+        simd_sincos(beta[j] * d, sin_y, cos_y);
+        T e_real = magnitude * cos_y;
+        T e_imag = magnitude * sin_y;
+
+        T num_real = g_real[j] - e_real;
+        T num_imag = g_imag[j] - e_imag;
+        T den_real = (T) 1.0 - (g_real[j] * e_real - g_imag[j] * e_imag);
+        T den_imag = -(g_real[j] * e_imag + g_imag[j] * e_real);
+        T ratio = (num_real*num_real + num_imag*num_imag)
+            / (den_real*den_real + den_imag*den_imag);
+        row[j] = scale[j] * simd_log(ratio);
+    };
+};
+
+
+SIMD_CLONES
+void layer_row(
+    const double *g_real, const double *g_imag, const double *alpha,
+    const double *beta, const double *scale, double d, double *row,
+    Py_ssize_t length
+    ) {
+    layer_row_body(g_real, g_imag, alpha, beta, scale, d, row, length);
+};
+
+SIMD_CLONES
+void layer_row(
+    const float *g_real, const float *g_imag, const float *alpha,
+    const float *beta, const float *scale, float d, float *row,
+    Py_ssize_t length
+    ) {
+    layer_row_body(g_real, g_imag, alpha, beta, scale, d, row, length);
+};
+
+
+template <typename T>
+void Cgamma_rows(
+    const T *f, const T *d, const T *e1, const T *e2,
+    const T *mu1, const T *mu2, T *out,
+    Py_ssize_t f_length, Py_ssize_t d_length, int n_threads
+    ) {
+
+    layer_terms<T> terms(f, e1, e2, mu1, mu2, f_length);
+
+    parallel_blocks(d_length, n_threads, [&](Py_ssize_t start, Py_ssize_t stop){
+        for (Py_ssize_t i = start; i < stop; i++){
+            layer_row(
+                terms.g_real.data(), terms.g_imag.data(), terms.alpha.data(),
+                terms.beta.data(), terms.scale.data(), d[i], out + i*f_length,
+                f_length
+            );
+        };
+    });
 };
 
 
 static PyObject *Cgamma(
         PyObject *f, PyObject *d, PyObject *e1, 
-        PyObject *e2, PyObject *mu1, PyObject *mu2
+        PyObject *e2, PyObject *mu1, PyObject *mu2, int n_threads
     ) {
 
     int f_length = PyObject_Length(f);
@@ -66,6 +475,14 @@ static PyObject *Cgamma(
         d_cpp[index] = PyFloat_AsDouble(item);
     };
 
+    double *rl = new double[d_length*f_length];
+
+    Py_BEGIN_ALLOW_THREADS
+    Cgamma_into(
+        NA[0], d_cpp, NA[1], NA[2], NA[3], NA[4], rl, f_length, d_length, n_threads
+    );
+    Py_END_ALLOW_THREADS
+
     PyObject *outer = PyList_New(d_length*f_length);
 
     int count = 0;
@@ -73,16 +490,16 @@ static PyObject *Cgamma(
         for (int j = 0; j < f_length; j++){
 
             PyObject* single_res = Py_BuildValue(
-                "[f, f, f]", reflection_loss(
-                    NA[0][j], d_cpp[i], NA[1][j], 
-                    NA[2][j], NA[3][j], NA[4][j]
-                ), NA[0][j], d_cpp[i]
+                "[f, f, f]", rl[count], NA[0][j], d_cpp[i]
             );
             PyList_SetItem(outer, count, single_res);
             count += 1;
         };
     };
 
+    delete[] rl;
+    rl = nullptr;
+
     for (int i=0; i<sizeof(NA)/sizeof(*NA); i++){
         delete[] NA[i];
         NA[i] = nullptr;
@@ -97,12 +514,220 @@ static PyObject *Cgamma(
 static PyObject *gamma(PyObject *self, PyObject *args) {
 
     PyObject *f, *d, *e1, *e2, *mu1, *mu2;
+    int n_threads = 1;
+
+    if (!PyArg_ParseTuple(
+            args, "OOOOOO|i", &f, &d, &e1, &e2, &mu1, &mu2, &n_threads
+        )){
+        return NULL;
+    };
+
+    return Cgamma(f, d, e1, e2, mu1, mu2, n_threads);
+};
+
+/*
+the element type of a buffer, 'd' for float64 or 'f' for float32, or 0 for
+anything else
+*/
+static char float_format(const Py_buffer *view) {
+    const char *fmt = view->format;
+    if (fmt == NULL) {
+        return view->itemsize == sizeof(double) ? 'd' : 0;
+    };
+    if (fmt[0] == '@' || fmt[0] == '=' || fmt[0] == '<') {
+        fmt++;
+    };
+    if (strcmp(fmt, "d") == 0 && view->itemsize == sizeof(double)) {
+        return 'd';
+    };
+    if (strcmp(fmt, "f") == 0 && view->itemsize == sizeof(float)) {
+        return 'f';
+    };
+    return 0;
+};
+
+
+static int get_float_buffer(PyObject *obj, Py_buffer *view, bool writable) {
+    int flags = PyBUF_C_CONTIGUOUS | PyBUF_FORMAT;
+    if (writable) {
+        flags |= PyBUF_WRITABLE;
+    };
+    if (PyObject_GetBuffer(obj, view, flags) < 0) {
+        return -1;
+    };
+    if (float_format(view) == 0) {
+        PyBuffer_Release(view);
+        PyErr_SetString(
+            PyExc_TypeError,
+            "gamma_into requires C-contiguous float64 or float32 buffers"
+        );
+        return -1;
+    };
+    return 0;
+};
+
+
+/*
+acquires the 7 buffers f, d, e1, e2, mu1, mu2 and out, which must all hold
+the same element type, returned in format
+*/
+static int parse_buffers(
+        PyObject *args, PyObject **objs, Py_buffer *views,
+        int *release_gil, int *n_threads, char *format
+    ) {
+
+    if (!PyArg_ParseTuple(
+            args, "OOOOOOO|pi", &objs[0], &objs[1], &objs[2], &objs[3],
+            &objs[4], &objs[5], &objs[6], release_gil, n_threads
+        )){
+        return -1;
+    };
+
+    for (int acquired = 0; acquired < 7; acquired++){
+        if (get_float_buffer(objs[acquired], &views[acquired], acquired == 6) < 0){
+            for (int i = 0; i < acquired; i++){
+                PyBuffer_Release(&views[i]);
+            };
+            return -1;
+        };
+    };
+
+    *format = float_format(&views[0]);
+    for (int i = 1; i < 7; i++){
+        if (float_format(&views[i]) != *format){
+            for (int k = 0; k < 7; k++){
+                PyBuffer_Release(&views[k]);
+            };
+            PyErr_SetString(
+                PyExc_TypeError,
+                "gamma_into requires all buffers to be float64, or all float32"
+            );
+            return -1;
+        };
+    };
+    return 0;
+};
 
-    if (!PyArg_ParseTuple(args, "OOOOOO", &f, &d, &e1, &e2, &mu1, &mu2)){
+
+static PyObject *release_buffers(
+        PyObject *out, Py_buffer *views, const char *error
+    ) {
+
+    for (int i = 0; i < 7; i++){
+        PyBuffer_Release(&views[i]);
+    };
+
+    if (error != NULL){
+        PyErr_SetString(PyExc_ValueError, error);
+        return NULL;
+    };
+
+    Py_INCREF(out);
+    return out;
+};
+
+
+template <typename T>
+static const char *run_gamma_into(Py_buffer *views, int release_gil, int n_threads) {
+
+    Py_ssize_t f_length = views[0].len / sizeof(T);
+    Py_ssize_t d_length = views[1].len / sizeof(T);
+
+    for (int i = 2; i < 6; i++){
+        if (views[i].len / (Py_ssize_t) sizeof(T) != f_length){
+            return "e1, e2, mu1 and mu2 must be the same length as f";
+        };
+    };
+    if (views[6].len / (Py_ssize_t) sizeof(T) != f_length*d_length){
+        return "out must hold exactly len(d) * len(f) values";
+    };
+
+    const T *f = (const T *) views[0].buf;
+    const T *d = (const T *) views[1].buf;
+    const T *e1 = (const T *) views[2].buf;
+    const T *e2 = (const T *) views[3].buf;
+    const T *mu1 = (const T *) views[4].buf;
+    const T *mu2 = (const T *) views[5].buf;
+    T *out = (T *) views[6].buf;
+
+    if (release_gil){
+        Py_BEGIN_ALLOW_THREADS
+        Cgamma_rows(f, d, e1, e2, mu1, mu2, out, f_length, d_length, n_threads);
+        Py_END_ALLOW_THREADS
+    } else {
+        Cgamma_rows(f, d, e1, e2, mu1, mu2, out, f_length, d_length, n_threads);
+    };
+    return NULL;
+};
+
+
+template <typename T>
+static const char *run_gamma_cells(Py_buffer *views, int release_gil, int n_threads) {
+
+    Py_ssize_t length = views[0].len / sizeof(T);
+
+    for (int i = 1; i < 7; i++){
+        if (views[i].len / (Py_ssize_t) sizeof(T) != length){
+            return "f, d, e1, e2, mu1, mu2 and out must all be the same length";
+        };
+    };
+
+    const T *f = (const T *) views[0].buf;
+    const T *d = (const T *) views[1].buf;
+    const T *e1 = (const T *) views[2].buf;
+    const T *e2 = (const T *) views[3].buf;
+    const T *mu1 = (const T *) views[4].buf;
+    const T *mu2 = (const T *) views[5].buf;
+    T *out = (T *) views[6].buf;
+
+    if (release_gil){
+        Py_BEGIN_ALLOW_THREADS
+        Cgamma_cells(f, d, e1, e2, mu1, mu2, out, length, n_threads);
+        Py_END_ALLOW_THREADS
+    } else {
+        Cgamma_cells(f, d, e1, e2, mu1, mu2, out, length, n_threads);
+    };
+    return NULL;
+};
+
+
+static PyObject *gamma_into(PyObject *self, PyObject *args) {
+
+    PyObject *objs[7];
+    Py_buffer views[7];
+    int release_gil = 1;
+    int n_threads = 1;
+    char format;
+
+    if (parse_buffers(args, objs, views, &release_gil, &n_threads, &format) < 0){
         return NULL;
     };
 
-    return Py_BuildValue("O", Cgamma(f, d, e1, e2, mu1, mu2));
+    const char *error = format == 'f'
+        ? run_gamma_into<float>(views, release_gil, n_threads)
+        : run_gamma_into<double>(views, release_gil, n_threads);
+
+    return release_buffers(objs[6], views, error);
+};
+
+
+static PyObject *gamma_cells(PyObject *self, PyObject *args) {
+
+    PyObject *objs[7];
+    Py_buffer views[7];
+    int release_gil = 1;
+    int n_threads = 1;
+    char format;
+
+    if (parse_buffers(args, objs, views, &release_gil, &n_threads, &format) < 0){
+        return NULL;
+    };
+
+    const char *error = format == 'f'
+        ? run_gamma_cells<float>(views, release_gil, n_threads)
+        : run_gamma_cells<double>(views, release_gil, n_threads);
+
+    return release_buffers(objs[6], views, error);
 };
 
 static PyObject *test_extension(PyObject *self) {
@@ -111,10 +736,30 @@ static PyObject *test_extension(PyObject *self) {
 
 static char gamma_docs[] = 
     "A C++ extension for calculating the reflection loss. Accepts *only* 6 "
-    "lists of f, d, e1, e2, mu1, and mu2. lists 0 and 2-5 must be same length \n";
+    "lists of f, d, e1, e2, mu1, and mu2. lists 0 and 2-5 must be same length. "
+    "An optional n_threads (default 1) splits the thickness axis across worker "
+    "threads with the GIL released \n";
+
+static char gamma_into_docs[] =
+    "A C++ extension for calculating the reflection loss into a preallocated "
+    "buffer. Accepts f, d, e1, e2, mu1, mu2 and out as C-contiguous float64 "
+    "buffers (ndarrays, array.array, memoryviews) without copying, or all as "
+    "float32 buffers to compute in single precision, and an "
+    "optional release_gil flag (default True) and n_threads (default 1) which "
+    "splits the thickness axis across worker threads. out must hold len(d)*len(f) "
+    "values and is filled row-wise per thickness. Returns out. \n";
+
+static char gamma_cells_docs[] =
+    "A C++ extension for calculating the reflection loss at individual (f, d) "
+    "cells. Accepts f, d, e1, e2, mu1, mu2 and out as C-contiguous float64 "
+    "(or all float32) buffers of equal length, plus optional release_gil and "
+    "n_threads as in "
+    "gamma_into. out[k] is set to the reflection loss of cell k. Returns out. \n";
 
 static PyMethodDef extension_tools_methods[] = {
     {"gamma", (PyCFunction) gamma, METH_VARARGS, gamma_docs},
+    {"gamma_into", (PyCFunction) gamma_into, METH_VARARGS, gamma_into_docs},
+    {"gamma_cells", (PyCFunction) gamma_cells, METH_VARARGS, gamma_cells_docs},
     {"test_extension", (PyCFunction) test_extension, METH_NOARGS, "test C extension"},
     {NULL, NULL, 0, NULL}
 };
@@ -0,0 +1,102 @@
+import numpy as np
+
+from scipy.interpolate import LinearNDInterpolator
+
+CELL_DTYPE = np.dtype(
+    [
+        ("f_min", np.float64),
+        ("f_max", np.float64),
+        ("d_min", np.float64),
+        ("d_max", np.float64),
+        ("depth", np.int64),
+    ]
+)
+
+
+class AdaptiveGrid:
+    """the result of an adaptive reflection loss sweep. Holds every sampled
+    point as the flat arrays f, d and RL, and the leaf cells of the quadtree
+    as a structured array with fields ('f_min', 'f_max', 'd_min', 'd_max',
+    'depth'); the corners of every leaf cell are sampled points.
+    evaluations is the number of kernel evaluations used."""
+
+    def __init__(self, points, cells):
+        coords = np.array(list(points.keys()), dtype=np.float64).reshape(-1, 2)
+        self.f = coords[:, 0]
+        self.d = coords[:, 1]
+        self.RL = np.array(list(points.values()), dtype=np.float64)
+        self.cells = np.array(cells, dtype=CELL_DTYPE)
+        self.evaluations = len(self.RL)
+
+    def resample(self, f_set, d_set):
+        """linearly interpolates the sampled points onto the regular grid
+        f_set x d_set. Returns a (len(d_set), len(f_set)) array, laid out like
+        the 'RL' grid of reflection_loss, with nan outside the sampled
+        domain."""
+        interpolator = LinearNDInterpolator(np.column_stack((self.f, self.d)), self.RL)
+        f_grid, d_grid = np.meshgrid(
+            np.asarray(f_set, dtype=np.float64), np.asarray(d_set, dtype=np.float64)
+        )
+        return interpolator(f_grid, d_grid)
+
+
+def _needs_split(corners, tol, threshold):
+    low, high = min(corners), max(corners)
+    if high - low > tol:
+        return True
+    return threshold is not None and low <= threshold < high
+
+
+def adaptive_grid(surface, f_nodes, d_nodes, tol=1.0, threshold=-10, max_depth=4):
+    """samples surface(f, d) on the coarse grid f_nodes x d_nodes, then
+    recursively splits each cell into four while the reflection loss across
+    its corners varies by more than tol (dB) or the cell straddles threshold
+    (None disables this), up to max_depth times. All new points of a level
+    are evaluated in a single call to surface. Returns an AdaptiveGrid."""
+    if len(f_nodes) < 2 or len(d_nodes) < 2:
+        raise ValueError("the adaptive grid needs at least 2 f and 2 d nodes")
+    points = {}
+
+    def _evaluate(cells):
+        new = list(
+            dict.fromkeys(
+                (f, d)
+                for (f_min, f_max, d_min, d_max, _) in cells
+                for f in (f_min, f_max)
+                for d in (d_min, d_max)
+                if (f, d) not in points
+            )
+        )
+        if new:
+            coords = np.array(new, dtype=np.float64)
+            points.update(zip(new, surface(coords[:, 0], coords[:, 1]).tolist()))
+
+    cells = [
+        (f_min, f_max, d_min, d_max, 0)
+        for d_min, d_max in zip(d_nodes[:-1], d_nodes[1:])
+        for f_min, f_max in zip(f_nodes[:-1], f_nodes[1:])
+    ]
+    _evaluate(cells)
+
+    leaves = []
+    while cells:
+        split = []
+        for cell in cells:
+            f_min, f_max, d_min, d_max, depth = cell
+            corners = [points[(f, d)] for f in (f_min, f_max) for d in (d_min, d_max)]
+            if depth < max_depth and _needs_split(corners, tol, threshold):
+                split.append(cell)
+            else:
+                leaves.append(cell)
+
+        cells = []
+        for f_min, f_max, d_min, d_max, depth in split:
+            f_mid, d_mid = (f_min + f_max) / 2, (d_min + d_max) / 2
+            cells.extend(
+                (f_lo, f_hi, d_lo, d_hi, depth + 1)
+                for d_lo, d_hi in ((d_min, d_mid), (d_mid, d_max))
+                for f_lo, f_hi in ((f_min, f_mid), (f_mid, f_max))
+            )
+        _evaluate(cells)
+
+    return AdaptiveGrid(points, leaves)
@@ -0,0 +1,160 @@
+import numpy as np
+
+from .extensions import gamma_cells
+from .profiling import stage
+from .refactoring import evaluate, quarter_wave_unit
+
+
+def surface(fns, f, d, n_threads=1):
+    """reflection loss of the continuous surface built from the interpolants
+    fns, at the arbitrary cells (f, d), which are broadcast against each
+    other. Returns a flat float64 array."""
+    f, d = np.broadcast_arrays(
+        np.asarray(f, dtype=np.float64), np.asarray(d, dtype=np.float64)
+    )
+    f, d = np.ascontiguousarray(f.ravel()), np.ascontiguousarray(d.ravel())
+    out = np.empty(len(f), dtype=np.float64)
+    params = evaluate(fns, f)
+    with stage("gamma", len(f)):
+        gamma_cells(f, d, *params, out, True, n_threads)
+    return out
+
+
+class BandEngine:
+    """evaluates the reflection loss of the cells which fall within the
+    quarter-wave bounds of a response band. The interpolants are evaluated
+    once over the whole f_set and reused for every band m; the in-band cells
+    of a band are found with searchsorted on the sorted d_set and evaluated
+    in a single kernel call. dtype=np.float32 evaluates the cells in single
+    precision; the band bounds are always found in double precision."""
+
+    def __init__(self, f_set, d_set, fns, n_threads=1, dtype=np.float64):
+        self.f = np.asarray(f_set, dtype=np.float64)
+        self.d = np.asarray(d_set, dtype=np.float64)
+        self.n_threads = n_threads
+        self.dtype = np.dtype(dtype)
+        self.fns = fns
+        self.params = evaluate(fns, self.f)
+        # f, d and params as passed to the kernel, i.e. cast to dtype once
+        self._inputs = [
+            np.asarray(p, dtype=self.dtype) for p in (self.f, self.d, *self.params)
+        ]
+
+        self._order = np.argsort(self.d, kind="stable")
+        self._d_sorted = self.d[self._order]
+        self._unit = np.asarray(
+            quarter_wave_unit(*self.params, self.f), dtype=np.float64
+        )
+        self._bounds = {}
+
+    @staticmethod
+    def _bound(unit, m):
+        # same operation order as refactoring.dfind_half_values
+        return unit * (((2.0 * m) - 2.0) / 4.0) * 1000
+
+    def bounds(self, m):
+        """the quarter-wave thickness bound of band m at every frequency"""
+        if m not in self._bounds:
+            self._bounds[m] = self._bound(self._unit, m)
+        return self._bounds[m]
+
+    def _index_ranges(self, d_min, d_max):
+        lo = np.searchsorted(self._d_sorted, d_min, side="left")
+        hi = np.searchsorted(self._d_sorted, d_max, side="right")
+        return lo, np.maximum(hi, lo)
+
+    def cells(self, m):
+        """returns (rl, f_i, d_i) arrays for every in-band cell of band m,
+        ordered by frequency and then by thickness, where f_i and d_i index
+        into f_set and d_set."""
+        return self._cells_between(self.bounds(m), self.bounds(m + 1))
+
+    def bands(self, m_set):
+        """single pass version of cells for several bands at once. The cells
+        between the lower bound of min(m_set) and the upper bound of
+        max(m_set) are evaluated in one kernel call, then each cell is
+        bucketed into its band from its thickness in units of the
+        quarter-wave bound. Returns a dict of m -> (rl, f_i, d_i), identical
+        to calling cells(m) for each m. Non-integer m_set values fall back to
+        evaluating each band separately."""
+        m_set = list(m_set)
+        if not all(float(m).is_integer() for m in m_set):
+            return {m: self.cells(m) for m in m_set}
+
+        rl, f_i, d_i = self._cells_between(
+            self.bounds(min(m_set)), self.bounds(max(m_set) + 1)
+        )
+        with stage("bands.bucket", len(rl)):
+            return self._bucket(m_set, rl, f_i, d_i)
+
+    def _bucket(self, m_set, rl, f_i, d_i):
+        d, unit = self.d[d_i], self._unit[f_i]
+
+        # the band estimate can be off by one where d sits within rounding
+        # error of a bound, so it's corrected against the exact bounds
+        # such that bound(band) <= d < bound(band + 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            band = np.floor(2 * d / (unit * 1000)) + 1
+        band = np.where(d < self._bound(unit, band), band - 1, band)
+        band = np.where(d >= self._bound(unit, band + 1), band + 1, band)
+        # bands are closed intervals, so a cell on a bound is in both bands
+        on_bound = d == self._bound(unit, band)
+
+        results = {}
+        for m in m_set:
+            mask = (band == m) | (on_bound & (band == m + 1))
+            results[m] = (rl[mask], f_i[mask], d_i[mask])
+        return results
+
+    def surface(self, f, d):
+        """reflection loss of the continuous surface built from the
+        interpolants at the arbitrary cells (f, d), see surface"""
+        return surface(self.fns, f, d, self.n_threads)
+
+    def grid(self, rl, f_i, d_i):
+        """scatters the cells of a band onto a (len(d_set), len(f_set)) array,
+        with nan for every cell outside of the band"""
+        grid = np.full((len(self.d), len(self.f)), np.nan, dtype=self.dtype)
+        grid[d_i, f_i] = rl
+        return grid
+
+    def _cells_between(self, d_min, d_max):
+        lo, hi = self._index_ranges(d_min, d_max)
+        counts = hi - lo
+        f_i = np.repeat(np.arange(len(self.f)), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        d_i = self._order[starts + np.arange(counts.sum())]
+        return self.evaluate(f_i, d_i), f_i, d_i
+
+    def at(self, d, f_i=None):
+        """reflection loss at each frequency f_set[f_i] (every frequency by
+        default) at its own thickness d, which need not be in d_set"""
+        if f_i is None:
+            f_i = np.arange(len(self.f))
+        out = np.empty(len(f_i), dtype=self.dtype)
+        f, _, *params = self._inputs
+        with stage("gamma", len(f_i)):
+            gamma_cells(
+                f[f_i],
+                np.ascontiguousarray(d, dtype=self.dtype),
+                *(p[f_i] for p in params),
+                out,
+                True,
+                self.n_threads,
+            )
+        return out
+
+    def evaluate(self, f_i, d_i):
+        """reflection loss of the cells (f_set[f_i], d_set[d_i])"""
+        out = np.empty(len(f_i), dtype=self.dtype)
+        f, d, *params = self._inputs
+        with stage("gamma", len(f_i)):
+            gamma_cells(
+                f[f_i],
+                d[d_i],
+                *(p[f_i] for p in params),
+                out,
+                True,
+                self.n_threads,
+            )
+        return out
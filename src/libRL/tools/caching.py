@@ -0,0 +1,79 @@
+import hashlib
+import os
+
+from collections import namedtuple, OrderedDict
+from threading import Lock
+
+import numpy as np
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache:
+    """a bounded least-recently-used cache with functools-style hit/miss
+    statistics. A maxsize of 0 disables caching altogether."""
+
+    def __init__(self, maxsize=32):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """returns the cached value of key, calling factory() to make it on a
+        miss"""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        value = factory()
+        with self._lock:
+            if self._maxsize > 0:
+                self._entries[key] = value
+                self._evict()
+        return value
+
+    def _evict(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        """sets the maximum number of entries, evicting the oldest if needed"""
+        if maxsize < 0:
+            raise ValueError("maxsize must be a non-negative integer")
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self._maxsize, len(self._entries))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def content_key(*arrays, extra=()):
+    """a hash of the contents of arrays, plus any hashable extra values"""
+    digest = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        digest.update(str(a.shape).encode())
+        digest.update(a.tobytes())
+    return (digest.hexdigest(), *extra)
+
+
+_MAXSIZE = int(os.environ.get("LIBRL_CACHE_SIZE", 32))
+
+# parsed data files, keyed by path, modification time and size
+data_cache = LRUCache(maxsize=_MAXSIZE)
+
+# fitted interpolants, keyed by the content of the data, interp and override
+interpolation_cache = LRUCache(maxsize=_MAXSIZE)
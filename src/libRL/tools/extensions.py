@@ -1,4 +1,14 @@
 try:
-    from libRL.tools._extensions import gamma, test_extension
+    from libRL.tools._extensions import (
+        gamma,
+        gamma_cells,
+        gamma_into,
+        test_extension,
+    )
 except ImportError:
-    from libRL.tools.redundancies import gamma, test_extension
+    from libRL.tools.redundancies import (
+        gamma,
+        gamma_cells,
+        gamma_into,
+        test_extension,
+    )
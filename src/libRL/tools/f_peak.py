@@ -1,60 +1,137 @@
-import itertools
+import numpy as np
 
-from .extensions import gamma
-from .refactoring import parse, interpolations, dfind_half
+from scipy.optimize import minimize, minimize_scalar
 
+from .profiling import profiled, session, stage
+from .refactoring import parse
+from ..reflection_loss import band_reflection_loss
 
-def _neighbors(d_i, f_i):
+PEAK_DTYPE = np.dtype([("RL", np.float64), ("f", np.float64), ("d", np.float64)])
+
+
+def _shifted(grid):
+    """the four edge-neighbours of every cell of grid, nan beyond its border"""
+    padded = np.pad(grid, 1, constant_values=np.nan)
     return (
-        (d_i + 1, f_i),
-        (d_i - 1, f_i),
-        (d_i, f_i - 1),
-        (d_i, f_i + 1),
+        padded[2:, 1:-1],
+        padded[:-2, 1:-1],
+        padded[1:-1, :-2],
+        padded[1:-1, 2:],
     )
 
 
+def local_minima(grid, threshold=None, prominence=0):
+    """returns a boolean mask of the strict local minima of a 2-D grid, i.e.
+    cells lower than all four of their edge-neighbours. Cells at the border of
+    the grid or next to a nan (out of band) cell have an unknown neighbour
+    and are never minima. If given, minima must also be at or below
+    threshold and at least prominence below their lowest neighbour."""
+    shifted = _shifted(grid)
+    with np.errstate(invalid="ignore"):
+        mask = np.logical_and.reduce([grid < n for n in shifted])
+        if prominence:
+            mask &= np.fmin.reduce(shifted) - grid >= prominence
+        if threshold is not None:
+            mask &= grid <= threshold
+    return mask
+
+
+def refine_peak(engine, f, d, f_bounds, d_bounds, rtol=1e-4):
+    """refines a grid minimum at (f, d) on the continuous reflection loss
+    surface of engine within f_bounds x d_bounds, i.e. between the
+    neighbouring grid cells, with a bounded Nelder-Mead search. If the
+    surface keeps descending past the bounds the grid minimum lies on a
+    valley rather than at an isolated minimum, and the frequency of the
+    valley floor is refined at fixed d instead. Returns the refined
+    (RL, f, d) and the number of surface evaluations used."""
+    f_half = (f_bounds[1] - f_bounds[0]) / 4
+    d_half = (d_bounds[1] - d_bounds[0]) / 4
+    xatol = rtol * max(f_half, d_half)
+
+    def _rl(f, d):
+        return engine.surface(f, d)[0]
+
+    result = minimize(
+        lambda x: _rl(*x),
+        [f, d],
+        method="Nelder-Mead",
+        bounds=[f_bounds, d_bounds],
+        options=dict(
+            initial_simplex=[[f, d], [f + f_half, d], [f, d + d_half]],
+            xatol=xatol,
+            fatol=1e-9,
+        ),
+    )
+    (f_opt, d_opt), evaluations = result.x, result.nfev
+
+    on_bounds = np.isclose([f_opt, d_opt], [f_bounds, d_bounds], rtol=0, atol=xatol)
+    if on_bounds.any():
+        result = minimize_scalar(
+            lambda x: _rl(x, d),
+            bounds=f_bounds,
+            method="bounded",
+            options=dict(xatol=xatol),
+        )
+        f_opt, d_opt, evaluations = result.x, d, evaluations + result.nfev
+
+    rl, rl_grid = _rl(f_opt, d_opt), _rl(f, d)
+    if not rl <= rl_grid:
+        return (rl_grid, f, d), evaluations + 2
+    return (rl, f_opt, d_opt), evaluations + 2
+
+
+@profiled("f_peak")
 def f_peak(data, f_set=None, d_set=None, **kwargs):
     """a closure for determining the peak values along a response band. Returns
-    a function which takes m as input, and returns a list of lists formatted
-    [RL, f, d] for each local max value found in the band."""
-    data = parse.data(data)
+    a function which takes m as input, and returns a structured ndarray with
+    fields ('RL', 'f', 'd') holding each local minimum found in the band,
+    ordered by thickness and then frequency. Peaks are the cells of the band's
+    reflection loss grid which are lower than all four of their neighbours,
+    see local_minima; the threshold and prominence kwargs are forwarded to it.
+    n_threads is forwarded to the native kernel, see reflection_loss.
+
+    refine=True refines each peak off the grid on the continuous reflection
+    loss surface built from the interpolants, between the peak's neighbouring
+    cells, see refine_peak. This gives sub-step positions from a
+    coarse f_set and d_set; the total number of surface evaluations is
+    available as getattr(fn, 'evaluations')."""
+    data = parse.data(data, kwargs.get("cache", True))
 
-    f, e1, e2, mu1, mu2 = data
+    f, *_ = data
 
     f_set = parse.f_set(f_set, f)
     d_set = parse.d_set(d_set)
 
-    fns = interpolations(
-        f, e1, e2, mu1, mu2, kwargs.get("interp", "cubic"), kwargs.get("override")
-    )
+    _band_rl = band_reflection_loss(data, f_set=f_set, d_set=d_set, **kwargs)
+    engine = _band_rl.engine
 
     def _f_peak(m):
-        results = []
-        for f in f_set:
-            d_min = dfind_half(*fns, f, m)
-            d_max = dfind_half(*fns, f, m + 1)
-            d_vals = [d for d in d_set if d_min <= d <= d_max]
-            reflection_loss_values = gamma(
-                [f], d_vals, *(list(map(fn, [f])) for fn in fns)
+        with session("f_peak.band", kwargs.get("profile")):
+            rl, f_i, d_i = engine.cells(m)
+            order = np.argsort(engine.d, kind="stable")
+            grid = engine.grid(rl, f_i, d_i)[order]
+            mask = local_minima(
+                grid, kwargs.get("threshold"), kwargs.get("prominence", 0)
             )
+            rows, cols = np.nonzero(mask)
+            peaks = np.empty(len(rows), dtype=PEAK_DTYPE)
+            peaks["RL"] = grid[rows, cols]
+            peaks["f"] = engine.f[cols]
+            peaks["d"] = engine.d[order][rows]
 
-            results.extend(reflection_loss_values)
-        results.sort(key=lambda item: item[2])
-
-        rl_vals = []
-        for _, grouper in itertools.groupby(results, key=lambda item: item[2]):
-            rl_vals.append([v[0] for v in grouper])
-
-        f_peaks = []
-        for d_i, d in enumerate(d_set):
-            for f_i, f in enumerate(f_set):
-                try:
-                    rl_val = rl_vals[d_i][f_i]
-                    subarr = (rl_vals[i][j] for (i, j) in _neighbors(d_i, f_i))
-                    if all(rl_val < i for i in subarr):
-                        f_peaks.append([rl_val, f, d])
-                except IndexError:
-                    continue
-        return f_peaks
+            if kwargs.get("refine"):
+                d_sorted = engine.d[order]
+                with stage("f_peak.refine", len(rows)):
+                    for i, (row, col) in enumerate(zip(rows, cols)):
+                        peaks[i], evaluations = refine_peak(
+                            engine,
+                            peaks["f"][i],
+                            peaks["d"][i],
+                            (engine.f[col - 1], engine.f[col + 1]),
+                            (d_sorted[row - 1], d_sorted[row + 1]),
+                        )
+                        _f_peak.evaluations += evaluations
+            return peaks
 
+    _f_peak.evaluations = 0
     return _f_peak
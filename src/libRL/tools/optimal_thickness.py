@@ -0,0 +1,95 @@
+import numpy as np
+
+from .bands import BandEngine
+from .f_peak import PEAK_DTYPE
+from .profiling import profiled, stage
+from .refactoring import interpolations, parse
+
+# the fraction of the interval kept each golden-section step, 1 / phi
+INVPHI = (np.sqrt(5) - 1) / 2
+
+
+def golden_section(fn, lower, upper, xatol=1e-4, maxiter=200):
+    """golden-section search for the minima of several 1-D functions at once,
+    each on its own interval [lower[i], upper[i]]. fn(x, i) returns the value
+    of each function i at x, and is called once per step for only the
+    intervals which are still wider than xatol. Returns (x, fx, evaluations)
+    arrays, where evaluations is the number of points each function was
+    evaluated at. The functions are assumed to be unimodal on their
+    intervals; otherwise a local minimum is found."""
+    a = np.array(lower, dtype=np.float64)
+    b = np.array(upper, dtype=np.float64)
+    index = np.arange(len(a))
+    c, d = b - INVPHI * (b - a), a + INVPHI * (b - a)
+    fc, fd = fn(c, index), fn(d, index)
+    evaluations = np.full(len(a), 2)
+
+    for _ in range(maxiter):
+        i = np.flatnonzero(b - a > xatol)
+        if not len(i):
+            break
+        # the minimum lies in [a, d] if fc < fd, otherwise in [c, b]
+        left = fc[i] < fd[i]
+        il, ir = i[left], i[~left]
+        b[il], d[il], fd[il] = d[il], c[il], fc[il]
+        a[ir], c[ir], fc[ir] = c[ir], d[ir], fd[ir]
+
+        x = np.where(left, b[i] - INVPHI * (b[i] - a[i]), a[i] + INVPHI * (b[i] - a[i]))
+        fx = fn(x, i)
+        c[il], fc[il] = x[left], fx[left]
+        d[ir], fd[ir] = x[~left], fx[~left]
+        evaluations[i] += 1
+
+    lower_c = fc < fd
+    return np.where(lower_c, c, d), np.where(lower_c, fc, fd), evaluations
+
+
+@profiled("optimal_thickness")
+def optimal_thickness(data, f_set=None, m_set=1, **kwargs):
+    """finds the thickness of minimum reflection loss at each frequency in
+    f_set for each band in m_set, returned as {m: ndarray} of structured
+    arrays with fields ('RL', 'f', 'd'), one per frequency. Rather than
+    scanning a d_set, each minimum is solved for on the continuous reflection
+    loss of the interpolants between the quarter-wave bounds of bands m and
+    m + 1 (see tools.refactoring.dfind_half), with a golden-section search
+    run across every frequency at once, see golden_section. Thicknesses are
+    found to within xatol mm (default 1e-4), which takes about 30
+    evaluations per frequency. Frequencies whose bounds aren't finite are
+    nan. n_threads is forwarded to the native kernel, see reflection_loss."""
+    data = parse.data(data, kwargs.get("cache", True))
+
+    f, e1, e2, mu1, mu2 = data
+
+    f_set = parse.f_set(f_set, f)
+    m_set = parse.m_set(m_set)
+
+    fns = interpolations(
+        f,
+        e1,
+        e2,
+        mu1,
+        mu2,
+        kwargs.get("interp", "cubic"),
+        kwargs.get("override"),
+        kwargs.get("cache", True),
+    )
+    engine = BandEngine(f_set, [], fns, parse.n_threads(kwargs.get("n_threads")))
+    xatol = kwargs.get("xatol", 1e-4)
+
+    results = {}
+    for m in m_set:
+        with stage("optimal_thickness.band") as record:
+            lower, upper = engine.bounds(m), engine.bounds(m + 1)
+            with np.errstate(invalid="ignore"):
+                valid = np.isfinite(lower) & np.isfinite(upper) & (upper > lower)
+            f_i = np.flatnonzero(valid)
+            d, rl, evaluations = golden_section(
+                lambda x, i: engine.at(x, f_i[i]), lower[valid], upper[valid], xatol
+            )
+            record.points = int(evaluations.sum())
+
+        optima = np.full(len(engine.f), np.nan, dtype=PEAK_DTYPE)
+        optima["f"] = engine.f
+        optima["d"][f_i], optima["RL"][f_i] = d, rl
+        results[m] = optima
+    return results
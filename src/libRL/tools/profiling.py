@@ -0,0 +1,208 @@
+import contextlib
+import functools
+import os
+import sys
+import time
+
+from contextvars import ContextVar
+
+# the Profile being recorded into, if any
+_active = ContextVar("libRL_profile", default=None)
+
+# the profile option used when an entry point isn't given one, see enabled
+_default = ContextVar("libRL_profile_default", default=None)
+
+
+class Profile:
+    """per-stage wall time, call count and grid-point count of a run. Stages
+    nest, so the time of a stage includes the stages run inside of it; the
+    outermost stage is the entry point which was called."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def _stats(self, name):
+        return self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "points": 0})
+
+    def record(self, name, seconds, points=0):
+        stats = self._stats(name)
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["points"] += points
+
+    def report(self):
+        """returns {stage: {'calls', 'seconds', 'points', 'points_per_second'}}
+        in the order the stages were first entered"""
+        return {
+            name: {
+                **stats,
+                "points_per_second": (
+                    stats["points"] / stats["seconds"] if stats["seconds"] else 0.0
+                ),
+            }
+            for name, stats in self.stages.items()
+        }
+
+    def __str__(self):
+        width = max([len(name) for name in self.stages] + [5])
+        lines = [
+            "{:<{w}}  {:>6}  {:>10}  {:>12}  {:>14}".format(
+                "stage", "calls", "seconds", "points", "points/s", w=width
+            )
+        ]
+        for name, stats in self.report().items():
+            lines.append(
+                "{:<{w}}  {calls:>6}  {seconds:>10.4f}  {points:>12}  "
+                "{points_per_second:>14,.0f}".format(name, w=width, **stats)
+            )
+        return "\n".join(lines)
+
+
+class _Stage:
+    def __init__(self, profile, name, points):
+        self.profile = profile
+        self.name = name
+        self.points = points
+
+    def __enter__(self):
+        self.profile._stats(self.name)  # so stages are reported in entry order
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.record(self.name, time.perf_counter() - self._start, self.points)
+        return False
+
+
+class _NullStage:
+    """stand in for _Stage when nothing is being profiled. points may still
+    be assigned, and is ignored."""
+
+    points = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, points=0):
+    """context manager timing a stage of the active profile. points is the
+    number of grid points (or rows) the stage covers, and can also be set on
+    the returned object inside the block. Does nothing when no profile is
+    active."""
+    profile = _active.get()
+    if profile is None:
+        return _NULL_STAGE
+    return _Stage(profile, name, points)
+
+
+def _resolve(option):
+    if option is None:
+        option = _default.get()
+    if option is None:
+        option = os.environ.get("LIBRL_PROFILE", "").lower() in ("1", "true", "yes")
+    return option
+
+
+def start(option=None):
+    """returns the Profile a run should record into given its profile option
+    (see session), or None if it shouldn't be profiled or a profile is already
+    active, in which case stages are recorded into that"""
+    if _active.get() is not None:
+        return None
+    option = _resolve(option)
+    if not option:
+        return None
+    return option if isinstance(option, Profile) else Profile()
+
+
+def finish(profile, option=None):
+    """hands a finished profile from start over as its option asks for"""
+    option = _resolve(option)
+    if profile is None or isinstance(option, Profile):
+        return
+    if option is True:
+        print(profile, file=sys.stderr)
+    elif callable(option):
+        option(profile)
+
+
+@contextlib.contextmanager
+def session(name, option=None, points=0):
+    """runs the block as the stage name of a profile. If a profile is
+    already active the block is recorded into it; otherwise option decides
+    whether to profile at all:
+
+    * None uses the option set by enabled, or else the LIBRL_PROFILE
+      environment variable ('1', 'true' or 'yes' profile to stderr)
+    * False disables profiling
+    * True prints the report to stderr once the block finishes
+    * a Profile instance is recorded into, so the caller can read it
+    * any other callable is called with the Profile once the block finishes,
+      i.e. to ship the report to a metrics system"""
+    if _active.get() is not None:
+        with stage(name, points) as record:
+            yield record
+        return
+
+    profile = start(option)
+    if profile is None:
+        yield _NULL_STAGE
+        return
+
+    token = _active.set(profile)
+    try:
+        with stage(name, points) as record:
+            yield record
+    finally:
+        _active.reset(token)
+    finish(profile, option)
+
+
+def profiled(name):
+    """decorator which runs a public entry point as a profiling session,
+    taking the option from its profile keyword argument, see session"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with session(name, kwargs.get("profile")):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def timed(name):
+    """decorator which records each call of fn as the stage name of the
+    active profile, if any"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def enabled(option=True):
+    """sets the profile option used by entry points which aren't given
+    one, for the duration of the block"""
+    token = _default.set(option)
+    try:
+        yield
+    finally:
+        _default.reset(token)
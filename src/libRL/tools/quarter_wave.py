@@ -4,6 +4,7 @@ from scipy.interpolate import interp1d
 from scipy.optimize import leastsq
 
 from .f_peak import f_peak
+from .profiling import profiled, session
 from .refactoring import parse
 from ..characterizations import characterization
 
@@ -11,6 +12,7 @@ c = 299792458  # speed of light
 GHz = 10 ** 9
 
 
+@profiled("quarter_wave")
 def quarter_wave(data=None, f_set=None, **kwargs):
     """a closure for calculating the quarter-wave relation of a dataset. Returns
     a function which takes m as input. frequencies used for calculation can be
@@ -21,8 +23,9 @@ def quarter_wave(data=None, f_set=None, **kwargs):
     n = interp1d(f, ref_index, kind="cubic", fill_value="extrapolate")
 
     def _quarter_wave(m):
-        res = ((2 * m - 1) / 4) * (c / (n(f) * (f * GHz)))
-        return res * 1000
+        with session("quarter_wave.band", kwargs.get("profile"), len(f)):
+            res = ((2 * m - 1) / 4) * (c / (n(f) * (f * GHz)))
+            return res * 1000
 
     _quarter_wave.f = f
     return _quarter_wave
@@ -36,20 +39,23 @@ def _residuals(p, d, f):
     return f - _fitting_function(d, *p)
 
 
+@profiled("power_fn")
 def power_fn(data=None, f_set=None, d_set=None, **kwargs):
     """a closure for generating f(d) = ad^b for band m. returns a function which
     takes m as input. thicknesses used for calculation can be acquired using
-    getattr(fn, 'd')"""
+    getattr(fn, 'd'). refine=True fits against peaks refined off the grid,
+    see f_peak, so a coarse f_set gives sub-step accuracy"""
     initial_guess = kwargs.get("initial", [1, 1])
     d_set = parse.d_set(d_set)
-    data = parse.data(data)
+    data = parse.data(data, kwargs.get("cache", True))
 
     def _power_fn(m):
-        _f_peak = f_peak(data=data, f_set=f_set, d_set=d_set, m_set=[m], **kwargs)
-        _data = np.array(_f_peak(m))
-        d, f = _data[:, 2], _data[:, 1]
-        constants, *_ = leastsq(_residuals, initial_guess, args=(d, f))
-        return np.array([_fitting_function(d_i, *constants) for d_i in d_set])
+        with session("power_fn.band", kwargs.get("profile")):
+            _f_peak = f_peak(data=data, f_set=f_set, d_set=d_set, m_set=[m], **kwargs)
+            _data = _f_peak(m)
+            d, f = _data["d"], _data["f"]
+            constants, *_ = leastsq(_residuals, initial_guess, args=(d, f))
+            return np.array([_fitting_function(d_i, *constants) for d_i in d_set])
 
     _power_fn.d = d_set
     return _power_fn
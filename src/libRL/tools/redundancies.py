@@ -1,11 +1,63 @@
 import cmath
 
+import numpy as np
+
+from .vectorized import gamma_layer_into, gamma_values
+
 
 def test_extension():
     return 0
 
 
-def gamma(f, d, e1, e2, mu1, mu2):
+_FORMATS = {
+    **{prefix + "d": np.float64 for prefix in ("", "@", "=", "<")},
+    **{prefix + "f": np.float32 for prefix in ("", "@", "=", "<")},
+}
+
+
+def _floats(*buffers):
+    """ndarray views of the buffers, which must all be float64 or all be
+    float32, as the C++ kernels require"""
+    arrays = []
+    for buffer in buffers:
+        view = memoryview(buffer)
+        if not view.c_contiguous:
+            raise ValueError("gamma_into requires C-contiguous buffers")
+        if view.format not in _FORMATS:
+            raise TypeError("gamma_into requires float64 or float32 buffers")
+        arrays.append(np.frombuffer(view, dtype=_FORMATS[view.format]))
+    if len({a.dtype for a in arrays}) > 1:
+        raise TypeError("gamma_into requires all buffers to be float64, or all float32")
+    return arrays
+
+
+def gamma_into(f, d, e1, e2, mu1, mu2, out, release_gil=True, n_threads=1):
+    """fallback for the C++ gamma_into. Writes the reflection loss grid into
+    the float64 (or float32) buffer out row-wise per thickness and returns
+    out. Like the native kernel, it works from the per-frequency terms of
+    vectorized.layer_terms. numpy releases the GIL inside its ufuncs, so
+    n_threads > 1 splits the thickness axis across a thread pool."""
+    f, d, e1, e2, mu1, mu2, target = _floats(f, d, e1, e2, mu1, mu2, out)
+    if any(len(p) != len(f) for p in (e1, e2, mu1, mu2)):
+        raise ValueError("e1, e2, mu1 and mu2 must be the same length as f")
+    if target.size != len(d) * len(f):
+        raise ValueError("out must hold exactly len(d) * len(f) values")
+    gamma_layer_into(f, d, e1, e2, mu1, mu2, target.reshape(len(d), len(f)), n_threads)
+    return out
+
+
+def gamma_cells(f, d, e1, e2, mu1, mu2, out, release_gil=True, n_threads=1):
+    """fallback for the C++ gamma_cells. Writes the reflection loss of each
+    (f[k], d[k]) cell into the float64 (or float32) buffer out and returns
+    out."""
+    f, d, e1, e2, mu1, mu2, target = _floats(f, d, e1, e2, mu1, mu2, out)
+    if any(len(p) != len(f) for p in (d, e1, e2, mu1, mu2, target)):
+        raise ValueError("f, d, e1, e2, mu1, mu2 and out must all be the same length")
+    target[...] = gamma_values(f, d, e1, e2, mu1, mu2, target.dtype)
+    return out
+
+
+def gamma(f, d, e1, e2, mu1, mu2, n_threads=1):
     return [
         reflection_loss_function(*[params[0], param, *params[1:]])
         for param in d
@@ -1,14 +1,20 @@
 import csv
 import cmath
-import io
+import os
 
 import numpy as np
 
+from collections import namedtuple
+from decimal import Decimal
 from types import SimpleNamespace
 
 from numpy import sqrt
 from scipy.interpolate import interp1d
 
+from .caching import content_key, data_cache, interpolation_cache
+from .profiling import stage, timed
+from .vectorized import MAX_THREADS
+
 
 def _data_generator(f):
     for r in csv.reader(f):
@@ -19,24 +25,76 @@ def _data_generator(f):
             continue
 
 
-def _parse_file(_input):
-    if isinstance(_input, list):
-        return _input
-    if isinstance(_input, io.StringIO):
-        return [list(i) for i in zip(*_data_generator(_input))]
-    if isinstance(_input, str):
-        with open(_input, "r") as fl:
-            return [list(i) for i in zip(*_data_generator(fl))]
-    raise ValueError("unable to parse data input, should be filepath or io.StringIO")
+def _columns(rows):
+    return [np.array(column, dtype=np.float64) for column in zip(*rows)]
+
+
+def _parse_text(text):
+    """parses the numeric rows of csv text into one float64 array per column.
+    Header lines are skipped up to the first numeric row and the rest is
+    handed to np.loadtxt in one go; input which loadtxt can't read as a
+    single block (i.e. non-numeric lines past the header, quoted or missing
+    values) falls back to skipping each non-numeric row with
+    _data_generator."""
+    lines = text.splitlines()
+    for start, line in enumerate(lines):
+        if next(_data_generator([line]), None):
+            break
+    else:
+        return []
+    try:
+        values = np.loadtxt(
+            lines[start:], delimiter=",", comments=None, ndmin=2, dtype=np.float64
+        )
+    except ValueError:
+        return _columns(_data_generator(lines[start:]))
+    return [np.ascontiguousarray(column) for column in values.T]
+
+
+def _read_file(filepath):
+    with open(filepath, "r") as fl:
+        return _parse_text(fl.read())
+
+
+def _parse_file(_input, cache=True):
+    """parses data into a list of five float64 arrays, [f, e1, e2, mu1, mu2].
+    _input can be a filepath (str or pathlib.Path), the contents of a file as
+    bytes, a file object or io.StringIO, or already columnar data as a list
+    or ndarray with one row per column."""
+    with stage("parse") as record:
+        data = _parse_input(_input, cache)
+        record.points = len(data[0]) if data else 0
+    return data
+
+
+def _parse_input(_input, cache=True):
+    if isinstance(_input, (list, tuple, np.ndarray)):
+        return [np.array(column, dtype=np.float64) for column in _input]
+    if isinstance(_input, bytes):
+        return _parse_text(_input.decode())
+    if hasattr(_input, "read"):
+        text = _input.read()
+        return _parse_text(text.decode() if isinstance(text, bytes) else text)
+    if isinstance(_input, (str, os.PathLike)):
+        if not cache:
+            return _read_file(_input)
+        stat = os.stat(_input)
+        key = (os.path.abspath(_input), stat.st_mtime_ns, stat.st_size)
+        # copied so that callers can't modify the cached entry
+        return [c.copy() for c in data_cache.get(key, lambda: _read_file(_input))]
+    raise ValueError(
+        "unable to parse data input, should be a filepath, bytes, a file object, "
+        "a list or an ndarray"
+    )
 
 
 def _parse_f_set(f_set, f):
     if f_set is None:
-        return f
+        return f.tolist() if isinstance(f, np.ndarray) else f
     if isinstance(f_set, list):
         return f_set
     if isinstance(f_set, tuple):
-        return list(stepwise(*f_set))
+        return GridSpec(*f_set).tolist()
     raise ValueError("f_set must be either a tuple, list, or None")
 
 
@@ -44,7 +102,7 @@ def _parse_d_set(d_set):
     if isinstance(d_set, list):
         return d_set
     if isinstance(d_set, tuple):
-        return list(stepwise(*d_set))
+        return GridSpec(*d_set).tolist()
     if isinstance(d_set, (int, float)):
         return [d_set]
     raise ValueError("d_set must be either a value, a tuple, or a list")
@@ -54,23 +112,134 @@ def _parse_m_set(m_set):
     if isinstance(m_set, list):
         return m_set
     if isinstance(m_set, tuple):
-        return list(stepwise(*m_set))
+        return GridSpec(*m_set).tolist()
     if isinstance(m_set, (int, float)):
         return [m_set]
     raise ValueError("m_set must be either a value, a tuple, or a list")
 
 
+def _parse_n_threads(n_threads=None):
+    if n_threads is None:
+        n_threads = os.environ.get("LIBRL_NUM_THREADS", 1)
+    if n_threads in (0, "0", "auto"):
+        return min(os.cpu_count() or 1, MAX_THREADS)
+    try:
+        count = int(n_threads)
+    except (TypeError, ValueError):
+        raise ValueError("n_threads must be a positive integer, 0 or 'auto'")
+    # int() truncates floats, so 2.7 would silently run 2 threads
+    if count < 0 or (not isinstance(n_threads, str) and count != n_threads):
+        raise ValueError("n_threads must be a positive integer, 0 or 'auto'")
+    return min(count, MAX_THREADS)
+
+
+def _parse_dtype(dtype=None):
+    """the precision reflection loss is computed and stored in, float64 by
+    default or float32 for screening sweeps"""
+    if dtype is None:
+        return np.dtype(np.float64)
+    try:
+        dtype = np.dtype(dtype)
+    except TypeError:
+        raise ValueError("dtype must be 'float64' or 'float32'")
+    if dtype not in (np.float64, np.float32):
+        raise ValueError("dtype must be 'float64' or 'float32'")
+    return dtype
+
+
+def _places(value):
+    # decimal places of value as written by repr, i.e. 1 for 2.0 and 5 for 1e-05
+    return max(0, -Decimal(repr(float(value))).as_tuple().exponent)
+
+
+class GridSpec(namedtuple("GridSpec", ["start", "stop", "step"], defaults=[None])):
+    """the regular grid of the (stop - start) // step values start,
+    start + step, ... given by a (start, stop, step) f_set, d_set or m_set
+    tuple, which can be passed as a GridSpec anywhere such a tuple is
+    accepted. Without a step the grid is the integers of range(start, stop).
+
+    The values are exact decimals: start, stop and step are scaled to
+    integers by 10 ** precision, where precision is the most decimal places
+    any of them has, so each value is the float nearest to start + i * step
+    worked out in decimal, and the number of values doesn't depend on
+    rounding error. GridSpecs are hashable, so can be used as cache keys."""
+
+    __slots__ = ()
+
+    @property
+    def precision(self):
+        """decimal places of the values"""
+        if not self.step:
+            return 0
+        return max(_places(v) for v in self)
+
+    def _scaled(self):
+        scale = 10 ** self.precision
+        return [
+            int(Decimal(repr(float(v))).scaleb(self.precision)) for v in self
+        ], scale
+
+    @property
+    def size(self):
+        """the number of values"""
+        if not self.step:
+            return max(0, int(self.stop) - int(self.start))
+        (start, stop, step), _ = self._scaled()
+        return max(0, (stop - start) // step)
+
+    def values(self):
+        """the grid as a float64 ndarray"""
+        if not self.step:
+            return np.arange(int(self.start), int(self.stop), dtype=np.float64)
+        (start, stop, step), scale = self._scaled()
+        size = max(0, (stop - start) // step)
+        if max(abs(start), abs(start + step * size), scale) < 2 ** 53:
+            # every scaled value is exact in float64, as is the division
+            return (start + step * np.arange(size, dtype=np.int64)) / scale
+        # i.e. a step of 0.1 + 0.2, whose 17 places overflow int64; python
+        # ints are exact at any size, and int / int rounds correctly
+        return np.array([(start + step * i) / scale for i in range(size)])
+
+    def tolist(self):
+        """the grid as a list of floats, or of ints without a step"""
+        if not self.step:
+            return list(range(int(self.start), int(self.stop)))
+        return self.values().tolist()
+
+
 def stepwise(start, stop, step=None):
-    if not step:
-        return range(int(start), int(stop))
-    _, precision = str(float(step)).split(".")
-    return (
-        round(start + (step * i), len(precision))
-        for i in range(int((stop - start) / step))
+    """the values of GridSpec(start, stop, step) as a list. Kept for
+    compatibility; libRL itself uses GridSpec directly"""
+    return GridSpec(start, stop, step).tolist()
+
+
+def precision(values):
+    """the most common number of decimal places among values, at least 1 as
+    in 2.0, found numerically rather than from their str so that integers
+    and values written in scientific notation are counted too"""
+    values = np.asarray(values, dtype=np.float64)
+    places = np.full(values.shape, 17)
+    for p in range(16, 0, -1):
+        with np.errstate(invalid="ignore"):
+            places[np.round(values, p) == values] = p
+    return int(np.bincount(places.ravel(), minlength=1).argmax())
+
+
+@timed("interpolate.fit")
+def interpolations(f, e1, e2, mu1, mu2, mode="cubic", override=None, cache=True):
+    """fits the four material interpolants. Fits are kept in an LRU cache
+    keyed by the content of the data plus mode and override, see
+    tools.caching.interpolation_cache; cache=False bypasses it."""
+    if not cache:
+        return _interpolations(f, e1, e2, mu1, mu2, mode, override)
+    key = content_key(f, e1, e2, mu1, mu2, extra=(mode, override))
+    fns = interpolation_cache.get(
+        key, lambda: _interpolations(f, e1, e2, mu1, mu2, mode, override)
     )
+    return list(fns)
 
 
-def interpolations(f, e1, e2, mu1, mu2, mode="cubic", override=None):
+def _interpolations(f, e1, e2, mu1, mu2, mode="cubic", override=None):
     fns = [
         interp1d(f, p, kind=mode, fill_value="extrapolate") for p in (e1, e2, mu1, mu2)
     ]
@@ -83,14 +252,45 @@ def interpolations(f, e1, e2, mu1, mu2, mode="cubic", override=None):
     return fns
 
 
+def evaluate(fns, f):
+    """evaluates each interpolant in fns across the frequency array f in a
+    single call. fns which reduce over their input (i.e. the 'es' override)
+    are evaluated pointwise so to match the values seen by the kernel."""
+    f = np.asarray(f, dtype=np.float64)
+    results = []
+    with stage("interpolate.evaluate", len(f)):
+        for fn in fns:
+            values = np.asarray(fn(f), dtype=np.float64)
+            if values.shape != f.shape:
+                values = np.array([fn(x) for x in f], dtype=np.float64)
+            results.append(values)
+    return results
+
+
 def dfind_half(e1f, e2f, mu1f, mu2f, f, m):
-    mu = mu1f(f) - cmath.sqrt(-1) * mu2f(f)
-    e = e1f(f) - cmath.sqrt(-1) * e2f(f)
+    return dfind_half_values(e1f(f), e2f(f), mu1f(f), mu2f(f), f, m)
+
+
+def dfind_half_values(e1, e2, mu1, mu2, f, m):
+    """dfind_half from already evaluated material values, so the quarter-wave
+    bounds of a whole frequency array can be found in one call."""
+    return quarter_wave_unit(e1, e2, mu1, mu2, f) * (((2.0 * m) - 2.0) / 4.0) * 1000
+
+
+def quarter_wave_unit(e1, e2, mu1, mu2, f):
+    """the m-independent factor of dfind_half_values, such that the bound of
+    band m is (unit * ((2m - 2) / 4)) * 1000"""
+    mu = mu1 - cmath.sqrt(-1) * mu2
+    e = e1 - cmath.sqrt(-1) * e2
     msq = 299792458 / (f * 10 ** 9)
-    y = (msq * (1.0 / (sqrt(mu * e).real)) * (((2.0 * m) - 2.0) / 4.0)) * 1000
-    return y
+    return msq * (1.0 / (sqrt(mu * e).real))
 
 
 parse = SimpleNamespace(
-    data=_parse_file, f_set=_parse_f_set, d_set=_parse_d_set, m_set=_parse_m_set
+    data=_parse_file,
+    f_set=_parse_f_set,
+    d_set=_parse_d_set,
+    m_set=_parse_m_set,
+    n_threads=_parse_n_threads,
+    dtype=_parse_dtype,
 )
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+c = 299792458  # speed of light
+GHz = 10 ** 9
+
+# the most worker threads a kernel is split across, as in _extensions.cpp
+MAX_THREADS = 256
+
+
+def gamma_values(f, d, e1, e2, mu1, mu2, dtype=np.float64):
+    """vectorized reflection loss of individual cells. All arguments are
+    broadcast against each other, so f, e1, e2, mu1 and mu2 may be 1-D arrays
+    over frequency while d is e.g. a column of thicknesses. dtype=np.float32
+    computes in single precision complex arithmetic throughout."""
+    f, d, e1, e2, mu1, mu2 = (
+        np.asarray(p, dtype=dtype) for p in (f, d, e1, e2, mu1, mu2)
+    )
+    j = np.array(1j, dtype=np.result_type(dtype, np.complex64))
+
+    er = e1 - j * e2
+    mur = mu1 - j * mu2
+
+    z = np.sqrt(mur / er)
+    k = 1j * np.sqrt(er * mur) * (2 * np.pi * f * GHz / c)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zt = z * np.tanh(k * (d * 0.001))
+        return 20 * np.log10(np.abs((zt - 1) / (zt + 1)))
+
+
+def layer_terms(f, e1, e2, mu1, mu2):
+    """the thickness-invariant factors of the reflection loss, found once per
+    frequency. Writing tanh(kd) in terms of exp(-2kd), the reflection of the
+    metal-backed layer becomes
+
+        (g - exp(-2kd)) / (1 - g * exp(-2kd)),  g = (z - 1) / (z + 1)
+
+    where g is the reflection of the air-material interface alone. Returns g,
+    -2k (per mm of thickness) and sign as arrays over f. For a gaining
+    material exp(-2kd) grows with d, so exp(2kd) is used instead, which
+    inverts |gamma|, and sign is -1 to undo it. When mu is 1 at every
+    frequency, as with override='x0', z and k both follow from a single
+    sqrt(er). The native gamma_into uses the same terms."""
+    f = np.asarray(f, dtype=np.float64)
+    e1, e2, mu1, mu2 = (np.asarray(p, dtype=np.float64) for p in (e1, e2, mu1, mu2))
+
+    er = e1 - 1j * e2
+    if np.all(mu1 == 1) and not np.any(mu2):
+        n = np.sqrt(er)
+        z = 1 / n
+    else:
+        mur = mu1 - 1j * mu2
+        n = np.sqrt(er * mur)
+        z = np.sqrt(mur / er)
+
+    g = (z - 1) / (z + 1)
+    decay = -2j * n * (2 * np.pi * f * GHz / c) * 0.001
+    gaining = decay.real > 0
+    return g, np.where(gaining, -decay, decay), np.where(gaining, -1.0, 1.0)
+
+
+def gamma_layer(g, decay, sign, d):
+    """reflection loss grid of shape (len(d), len(g)) from the terms of
+    layer_terms; the per-cell work is a single complex exp. Computed in the
+    precision of decay, i.e. single precision if it's complex64."""
+    d = np.asarray(d, dtype=decay.real.dtype)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # (e - g) / (g * e - 1) negates both sides of the quotient, which
+        # leaves it unchanged, so it can be found in place in two grids
+        e = decay * d[:, np.newaxis]
+        np.exp(e, out=e)
+        den = g * e
+        den -= 1
+        e -= g
+        e /= den
+        del den
+        rl = np.abs(e)
+        del e
+        np.log10(rl, out=rl)
+        rl *= 20 * sign
+        return rl
+
+
+def gamma_layer_into(f, d, e1, e2, mu1, mu2, out, n_threads=1):
+    """gamma_into via layer_terms and gamma_layer. Agrees with gamma_values
+    to within rounding (~1e-12 dB), rather than exactly. Writes the grid
+    into the ndarray out of shape (len(d), len(f)) and returns out. If out is
+    float32 the per-cell work is done in single precision, from terms found
+    in double precision."""
+    g, decay, sign = layer_terms(f, e1, e2, mu1, mu2)
+    complex_dtype = np.result_type(out.dtype, np.complex64)
+    g, decay = g.astype(complex_dtype), decay.astype(complex_dtype)
+    sign = sign.astype(out.dtype)
+    d = np.asarray(d, dtype=np.float64)
+    if out.shape != (len(d), len(g)):
+        raise ValueError("out must be of shape (len(d), len(f))")
+
+    def _rows(rows):
+        out[rows] = gamma_layer(g, decay, sign, d[rows])
+
+    split_rows(_rows, len(d), n_threads)
+    return out
+
+
+def split_rows(fn, n_rows, n_threads=1):
+    """calls fn with interleaved slices of range(n_rows), one per thread, up
+    to MAX_THREADS. numpy releases the GIL inside its ufuncs, so the threads
+    run in parallel."""
+    n_threads = max(1, min(n_threads, n_rows, MAX_THREADS))
+    blocks = [slice(i, n_rows, n_threads) for i in range(n_threads)]
+    if n_threads == 1:
+        fn(blocks[0])
+    else:
+        with ThreadPoolExecutor(n_threads) as pool:
+            list(pool.map(fn, blocks))
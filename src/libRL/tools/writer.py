@@ -1,15 +1,179 @@
 import csv
 import itertools
+import os
+import tempfile
 
+import numpy as np
 
+from .profiling import timed
+
+# extensions which are written as numpy binaries rather than as csv
+BINARY_FORMATS = (".npy", ".npz")
+
+
+def _extension(filepath):
+    if not isinstance(filepath, (str, os.PathLike)):
+        return ""
+    return os.path.splitext(os.fspath(filepath))[1].lower()
+
+
+@timed("write")
 def reflection_loss(data, filepath):
+    """writes reflection loss results, with the format picked from the
+    extension of filepath. '.npy' holds a single (len(d) + 1, len(f) + 1)
+    array whose first row is f and first column is d, with the RL grid below
+    and to the right of them, see open_reflection_loss. '.npz' holds 'f',
+    'd' and 'RL' as separate arrays. Anything else is written as csv. A
+    float32 RL grid is stored as float32 in '.npz' files, see _dtype; '.npy'
+    files are always float64, as they hold the f and d axes too."""
+    ext = _extension(filepath)
+    if ext == ".npy":
+        grid = _bordered(len(data["f"]), len(data["d"]))
+        _axes(grid, data["f"], data["d"])
+        grid[1:, 1:] = data["RL"]
+        return np.save(filepath, grid)
+    if ext == ".npz":
+        return np.savez(
+            filepath,
+            f=np.asarray(data["f"], dtype=np.float64),
+            d=np.asarray(data["d"], dtype=np.float64),
+            RL=np.asarray(data["RL"], dtype=_dtype(data["RL"])),
+        )
     with open(filepath, "w") as f:
         writer = csv.writer(f)
         f.write(','+','.join((str(i) for i in data["d"]))+'\n')
         writer.writerows(zip(data["f"], *data["RL"]))
 
 
+def open_reflection_loss(filepath, f_set, d_set, dtype=np.float64):
+    """creates the '.npy' file of reflection_loss as a writable memory-mapped
+    array with the f and d axes already filled in, so the RL grid at
+    [1:, 1:] can be written into directly, i.e. chunk by chunk"""
+    grid = np.lib.format.open_memmap(
+        filepath, mode="w+", dtype=dtype, shape=(len(d_set) + 1, len(f_set) + 1)
+    )
+    _axes(grid, f_set, d_set)
+    return grid
+
+
+def _dtype(rl):
+    # a float32 grid (see reflection_loss(dtype='float32')) is kept as
+    # float32 where it's stored apart from the float64 f and d axes
+    if getattr(rl, "dtype", None) == np.float32:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def _bordered(f_length, d_length, dtype=np.float64):
+    return np.empty((d_length + 1, f_length + 1), dtype=dtype)
+
+
+def _axes(grid, f_set, d_set):
+    grid[0, 0] = np.nan
+    grid[0, 1:] = f_set
+    grid[1:, 0] = d_set
+
+
+def load(filepath):
+    """loads a file written in one of BINARY_FORMATS. '.npy' files are
+    memory-mapped read-only, so nothing is copied until it's used; reflection
+    loss grids are returned as a dict of 'f', 'd' and 'RL' views into the
+    mapped file, and tables (characterization, band_analysis) as a
+    structured array. '.npz' files can't be memory-mapped and are read into a
+    dict of arrays."""
+    ext = _extension(filepath)
+    if ext == ".npz":
+        with np.load(filepath) as archive:
+            return {key: archive[key] for key in archive.files}
+    if ext == ".npy":
+        array = np.load(filepath, mmap_mode="r")
+        if array.dtype.names:
+            return array
+        return {"f": array[0, 1:], "d": array[1:, 0], "RL": array[1:, 1:]}
+    raise ValueError("filepath must end in one of {}".format(BINARY_FORMATS))
+
+
+@timed("write")
+def reflection_loss_chunks(f_set, d_set, chunks, filepath, rows=1024, dtype=np.float64):
+    """writes the (d_slice, rl_block) chunks of reflection_loss.iter_chunks
+    in the same formats as reflection_loss, with the RL of '.npz' files
+    stored as dtype. '.npy' chunks are written
+    straight into the memory-mapped file. For csv, which has one row per
+    frequency, and '.npz', the chunks are gathered in a temporary
+    memory-mapped file first, so only a single chunk and at most rows csv
+    rows are held in memory at once. filepath may also be an open text
+    stream, which is written as csv."""
+    f_set, d_set = list(f_set), list(d_set)
+    ext = _extension(filepath)
+    if ext == ".npy":
+        grid = open_reflection_loss(filepath, f_set, d_set)
+        _fill(grid[1:, 1:], chunks)
+        grid.flush()
+        return
+
+    with tempfile.TemporaryFile() as tmp:
+        if ext == ".npz":
+            grid = _temporary(tmp, (len(d_set), len(f_set)), dtype)
+            _fill(grid, chunks)
+            np.savez(
+                filepath,
+                f=np.asarray(f_set, dtype=np.float64),
+                d=np.asarray(d_set, dtype=np.float64),
+                RL=grid,
+            )
+            return
+
+        grid = _temporary(tmp, (len(f_set), len(d_set)), dtype)
+        _fill(grid.T, chunks)
+        if isinstance(filepath, (str, os.PathLike)):
+            with open(filepath, "w") as f:
+                _write_rows(f, f_set, d_set, grid, rows)
+        else:
+            _write_rows(filepath, f_set, d_set, grid, rows)
+
+
+def _temporary(tmp, shape, dtype=np.float64):
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(tmp, dtype=dtype, mode="w+", shape=shape)
+
+
+def _fill(grid, chunks):
+    start = 0
+    for d_slice, rl_block in chunks:
+        grid[start : start + len(d_slice)] = rl_block
+        start += len(d_slice)
+    if start != len(grid):
+        raise ValueError("chunks do not cover d_set")
+
+
+def _write_rows(f, f_set, d_set, grid, rows):
+    writer = csv.writer(f)
+    f.write(",".join(itertools.chain([""], (str(i) for i in d_set))) + "\n")
+    for start in range(0, len(f_set), rows):
+        block = np.asarray(grid[start : start + rows]).tolist()
+        writer.writerows(
+            [f_value, *row] for f_value, row in zip(f_set[start : start + rows], block)
+        )
+
+
+def _table(columns, filepath):
+    """writes a dict of equal length columns as a structured array ('.npy')
+    or one array per column ('.npz')"""
+    columns = {str(k): np.asarray(v, dtype=np.float64) for k, v in columns.items()}
+    if _extension(filepath) == ".npz":
+        return np.savez(filepath, **columns)
+    length = len(next(iter(columns.values()), []))
+    table = np.empty(length, dtype=[(k, np.float64) for k in columns])
+    for k, v in columns.items():
+        table[k] = v
+    return np.save(filepath, table)
+
+
+@timed("write")
 def characterization(data, filepath):
+    if _extension(filepath) in BINARY_FORMATS:
+        return _table(data, filepath)
     keys = list(data.keys())
     with open(filepath, "w") as f:
         writer = csv.writer(f)
@@ -17,8 +181,14 @@ def characterization(data, filepath):
         writer.writerows(zip(*(iter(data[i]) for i in keys)))
 
 
+@timed("write")
 def band_analysis(d_set, data, filepath):
     m_set = data.keys()
+    if _extension(filepath) in BINARY_FORMATS:
+        columns = {"d": d_set}
+        for m in m_set:
+            columns[m] = [data.get(m, {}).get(d, 0) for d in d_set]
+        return _table(columns, filepath)
     with open(filepath, "w") as f:
         writer = csv.writer(f)
         writer.writerow(itertools.chain("d", m_set))
@@ -1,6 +1,12 @@
 import os.path
 
+import numpy as np
+import pytest
+
 import libRL
+from libRL.band_analysis import band_intervals, cell_bandwidth, cell_intervals
+from libRL.reflection_loss import band_reflection_loss
+from libRL.tools.refactoring import parse
 
 from .utils import Expectation, LocalFileUtil
 
@@ -20,6 +26,30 @@ class TestBandAnalysis:
             for ai, ei in zip(ab.values(), eb.values())
         )
 
+    def test_band_analysis_threads(self, material_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.1), m_set=(1, 5, 1))
+        expected = libRL.band_analysis(material_fixture.name, **kwargs)
+        actual = libRL.band_analysis(material_fixture.name, n_threads=4, **kwargs)
+        assert actual == expected
+
+    def test_band_analysis_float32(self, material_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.1), m_set=(1, 5, 1))
+        expected = libRL.band_analysis(material_fixture.name, **kwargs)
+        actual = libRL.band_analysis(material_fixture.name, dtype="float32", **kwargs)
+        assert actual == expected
+        engine = band_reflection_loss(
+            material_fixture.name, dtype="float32", **kwargs
+        ).engine
+        assert engine.cells(1)[0].dtype == np.float32
+
+    def test_single_band_mode(self, material_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.1), m_set=[1, 2, 4])
+        expected = libRL.band_analysis(
+            material_fixture.name, multi_band=False, **kwargs
+        )
+        actual = libRL.band_analysis(material_fixture.name, **kwargs)
+        assert actual == expected
+
     def test_band_analysis_chi_zero(self, material_fixture):
         expected = Expectation("band_analysis_chi_zero.json")
         actual = libRL.band_analysis(
@@ -48,3 +78,175 @@ class TestBandAnalysis:
         actual = LocalFileUtil(filepath)
         expected = Expectation(filename)
         assert actual.read() == expected.read()
+
+    def test_save_band_analysis_npy(self, material_fixture, tempdir):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(1, 5, 0.1), m_set=(1, 5))
+        filepath = os.path.join(tempdir.name, "test_save_band_analysis.npy")
+        libRL.band_analysis(material_fixture.name, save=filepath, **kwargs)
+        expected = libRL.band_analysis(material_fixture.name, **kwargs)
+
+        actual = libRL.load(filepath)
+        assert actual.dtype.names == ("d", "1", "2", "3", "4")
+        assert actual["d"].tolist() == parse.d_set(kwargs["d_set"])
+        for m, results in expected.items():
+            assert actual[str(m)].tolist() == [
+                results.get(d, 0) for d in actual["d"].tolist()
+            ]
+
+    def test_multiple_thresholds(self, material_fixture, tempdir):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.1), m_set=(1, 5, 1))
+        actual = libRL.band_analysis(
+            material_fixture.name, threshold=[-10, -20, -30], **kwargs
+        )
+        assert list(actual.keys()) == [-10, -20, -30]
+        for t in (-10, -20, -30):
+            expected = libRL.band_analysis(material_fixture.name, threshold=t, **kwargs)
+            assert actual[t] == expected
+
+        filepath = os.path.join(tempdir.name, "thresholds.csv")
+        libRL.band_analysis(
+            material_fixture.name, threshold=(-10, -20), save=filepath, **kwargs
+        )
+        for t in (-10, -20):
+            expected = os.path.join(tempdir.name, "threshold_{}.csv".format(t))
+            libRL.band_analysis(
+                material_fixture.name, threshold=t, save=expected, **kwargs
+            )
+            actual = os.path.join(tempdir.name, "thresholds_{}.csv".format(t))
+            assert LocalFileUtil(actual).read() == LocalFileUtil(expected).read()
+
+    def test_band_analysis_grid_spec(self, material_fixture):
+        kwargs = dict(d_set=(0, 20, 0.1), m_set=(1, 5, 1))
+        expected = libRL.band_analysis(
+            material_fixture.name, f_set=(1, 18, 0.1), **kwargs
+        )
+        actual = libRL.band_analysis(
+            material_fixture.name, f_set=libRL.GridSpec(1, 18, 0.1), **kwargs
+        )
+        assert actual == expected
+        # integer frequencies have no decimal point to count
+        assert libRL.band_analysis(
+            material_fixture.name, f_set=list(range(1, 18)), **kwargs
+        )
+
+    def test_quarter_step(self, material_fixture):
+        # bandwidths keep the two decimal places of the step, i.e. 4.75 rather
+        # than 4.8
+        actual = libRL.band_analysis(
+            material_fixture.name, f_set=(1, 18, 0.25), d_set=(1, 5, 0.5), m_set=[1]
+        )
+        assert actual == {
+            1: {2.0: 4.75, 2.5: 4.0, 3.0: 3.75, 3.5: 3.5, 4.0: 2.5, 4.5: 1.75}
+        }
+
+    def test_interpolated_bandwidth(self, material_fixture):
+        kwargs = dict(d_set=[3.0, 4.5], m_set=[1])
+        fine = libRL.band_analysis(
+            material_fixture.name, f_set=(1, 18, 0.001), **kwargs
+        )
+        for method, tolerance in (("interp", 0.05), ("root", 0.002)):
+            coarse = libRL.band_analysis(
+                material_fixture.name, f_set=(1, 18, 0.1), method=method, **kwargs
+            )
+            for d, expected in fine[1].items():
+                assert abs(coarse[1][d] - expected) <= tolerance
+
+    def test_intervals(self, material_fixture, tempdir):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.5), m_set=[1, 2])
+        widths = libRL.band_analysis(material_fixture.name, method="root", **kwargs)
+        intervals = libRL.band_analysis(
+            material_fixture.name, method="root", intervals=True, **kwargs
+        )
+        for m, results in intervals.items():
+            assert list(results) == list(widths[m])
+            for d, found in results.items():
+                assert all(start <= stop for start, stop in found)
+                assert sum(stop - start for start, stop in found) == widths[m][d]
+
+        with pytest.raises(ValueError):
+            libRL.band_analysis(material_fixture.name, intervals=True, **kwargs)
+        with pytest.raises(ValueError):
+            libRL.band_analysis(material_fixture.name, method="spline", **kwargs)
+        with pytest.raises(ValueError):
+            libRL.band_analysis(
+                material_fixture.name,
+                method="interp",
+                intervals=True,
+                save=os.path.join(tempdir.name, "intervals.csv"),
+                **kwargs,
+            )
+
+    def test_optimize(self, material_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_bounds=(1, 5))
+        result = libRL.band_analysis.optimize(material_fixture.name, 1, **kwargs)
+        assert list(result) == ["d", "bandwidth", "evaluations"]
+        assert 1 <= result["d"] <= 5
+        assert result["evaluations"] < 60
+
+        # matches band_analysis at the same thickness, and a 0.05 mm scan
+        (expected,) = libRL.band_analysis(
+            material_fixture.name,
+            f_set=(1, 18, 0.1),
+            d_set=[result["d"]],
+            m_set=[1],
+            method="root",
+        )[1].values()
+        assert result["bandwidth"] == expected
+        scan = libRL.band_analysis(
+            material_fixture.name,
+            f_set=(1, 18, 0.1),
+            d_set=(1, 5, 0.05),
+            m_set=[1],
+            method="root",
+        )
+        assert result["bandwidth"] >= max(scan[1].values()) - 0.01
+
+        with pytest.raises(ValueError):
+            libRL.band_analysis.optimize(material_fixture.name, 1, method="count")
+        with pytest.raises(ValueError):
+            libRL.band_analysis.optimize(material_fixture.name, 1, d_bounds=(5, 1))
+
+
+def test_band_intervals():
+    f_set = [1.0, 2.0, 3.0, 4.0, 5.0]
+    rl = np.array(
+        [
+            [-5.0, -15.0, -5.0, -25.0, -12.0],
+            [np.nan, -12.0, -11.0, np.nan, np.nan],
+            [-1.0, -2.0, -3.0, -4.0, -5.0],
+        ]
+    )
+    rows, start, stop = band_intervals(rl, f_set, -10)
+    assert rows.tolist() == [0, 0, 1]
+    # crossings are interpolated between in-band cells, runs otherwise end
+    # at their last cell
+    assert start.tolist() == [1.5, 3.25, 2.0]
+    assert stop.tolist() == [2.5, 5.0, 3.0]
+
+
+def test_cell_bandwidth():
+    rl = np.array(
+        [[-12.0, -9.0, np.nan], [-25.0, -11.0, -10.0], [np.nan, np.nan, np.nan]]
+    )
+    # the in-band cells, in any order
+    d_i, f_i = np.nonzero(~np.isnan(rl))
+    rl, d_i = rl[d_i, f_i][::-1], d_i[::-1]
+    d_set = [2.0, 1.0, 3.0]
+    actual = cell_bandwidth(rl, d_i, d_set, 0.1, [-10, -20], f_precision=1)
+    assert actual == {-10: {1.0: 0.3, 2.0: 0.1}, -20: {1.0: 0.1}}
+    assert list(actual[-10].keys()) == [1.0, 2.0]
+    assert cell_bandwidth(rl, d_i, d_set, 0.5)[-10] == {1.0: 1.5, 2.0: 0.5}
+
+
+def test_cell_intervals():
+    # the cell version matches band_intervals for cells in any order
+    rl = np.array(
+        [[-12.0, -9.0, np.nan], [-25.0, -11.0, -10.0], [np.nan, -15.0, np.nan]]
+    )
+    d_i, f_i = np.nonzero(~np.isnan(rl))
+    d_i, f_i = d_i[::-1], f_i[::-1]
+    expected = band_intervals(rl, [1.0, 2.0, 3.0], -10)
+    actual = cell_intervals(rl[d_i, f_i], d_i, f_i, [1.0, 2.0, 3.0], -10)
+    for a, b in zip(actual, expected):
+        assert a.tolist() == b.tolist()
+    assert actual[0].tolist() == [0, 1, 2]
@@ -0,0 +1,110 @@
+import io
+import os.path
+
+import pytest
+
+import libRL
+from libRL.batch import BatchResult
+
+from .utils import LocalFileUtil
+
+
+class TestBatch:
+    kwargs = dict(f_set=(1, 18, 0.5), d_set=(0, 5, 0.5), m_set=[1, 2])
+
+    def test_batch(self, paraffin_fixture, material_fixture):
+        sources = [paraffin_fixture.name, material_fixture.name]
+        actual = list(libRL.batch(sources, max_workers=2, **self.kwargs))
+        assert sorted(res.source for res in actual) == sorted(sources)
+        for res in actual:
+            assert isinstance(res, BatchResult)
+            assert res.error is None
+            assert res.results["rl"] == libRL.reflection_loss(res.source, **self.kwargs)
+            assert res.results["ba"] == libRL.band_analysis(res.source, **self.kwargs)
+
+    def test_error_isolation(self, paraffin_fixture, material_fixture):
+        sources = [
+            paraffin_fixture.name,
+            "path/to/missing.csv",
+            io.StringIO(material_fixture.read()),
+            42,
+        ]
+        actual = list(
+            libRL.batch(sources, modes=["char"], chunksize=2, f_set=(1, 18, 1))
+        )
+        assert len(actual) == 4
+        errors = {str(res.source): res.error for res in actual}
+        assert errors[paraffin_fixture.name] is None
+        assert isinstance(errors["path/to/missing.csv"], FileNotFoundError)
+        assert isinstance(errors["42"], ValueError)
+        (parsed,) = [res for res in actual if isinstance(res.source, io.StringIO)]
+        assert parsed.error is None
+        assert parsed.results["char"] == libRL.characterization(
+            material_fixture.name, f_set=(1, 18, 1)
+        )
+
+    def test_output_dir(self, paraffin_fixture, tempdir):
+        (actual,) = libRL.batch(
+            [paraffin_fixture.name], output_dir=tempdir.name, **self.kwargs
+        )
+        filepath = os.path.join(tempdir.name, "paraffin_data_rl.csv")
+        assert actual.results["rl"] == filepath
+        assert actual.results["ba"] == os.path.join(
+            tempdir.name, "paraffin_data_ba.csv"
+        )
+        expected = os.path.join(tempdir.name, "expected_rl.csv")
+        libRL.reflection_loss(paraffin_fixture.name, save=expected, **self.kwargs)
+        assert LocalFileUtil(filepath).read() == LocalFileUtil(expected).read()
+
+    def test_output_dir_same_filenames(self, paraffin_fixture, tmp_path):
+        sources = []
+        for sub in ("a", "b"):
+            os.makedirs(tmp_path / sub)
+            sources.append(str(tmp_path / sub / "x.csv"))
+            with open(paraffin_fixture.name) as src, open(sources[-1], "w") as dst:
+                dst.write(src.read())
+        output_dir = str(tmp_path / "out")
+        os.makedirs(output_dir)
+        actual = list(
+            libRL.batch(
+                sources, modes=["char"], output_dir=output_dir, f_set=(1, 18, 1)
+            )
+        )
+        filepaths = sorted(res.results["char"] for res in actual)
+        assert filepaths == [
+            os.path.join(output_dir, "x_0_char.csv"),
+            os.path.join(output_dir, "x_1_char.csv"),
+        ]
+        assert all(os.path.isfile(filepath) for filepath in filepaths)
+
+    def test_bad_args(self, paraffin_fixture):
+        with pytest.raises(ValueError):
+            libRL.batch([paraffin_fixture.name], modes=["nope"])
+        with pytest.raises(ValueError):
+            libRL.batch([paraffin_fixture.name], chunksize=0)
+
+
+class TestMainBatch:
+    def test_main_batch(self, run_patch_and_catch, tmp_path):
+        output_dir = str(tmp_path / "out")
+        argv = ["libRL", "batch", "path/to/*.csv", "-j", "4", "-m", "1,3"]
+        args, kwargs = run_patch_and_catch("libRL.batch", argv + ["-o", output_dir], [])
+        assert args == ([],)
+        assert os.path.isdir(output_dir)
+        assert kwargs == {
+            "output_dir": output_dir,
+            "modes": ["rl", "ba"],
+            "max_workers": 4,
+            "chunksize": 1,
+            "f_set": None,
+            "d_set": (0, 5, 0.1),
+            "m_set": (1, 3),
+            "threshold": -10,
+        }
+
+    def test_batch_end_to_end(self, paraffin_fixture, tempdir, run_and_catch):
+        pattern = os.path.join(os.path.dirname(paraffin_fixture.name), "para*.csv")
+        args = ["libRL", "batch", pattern, "nothing*.csv", "-o", tempdir.name]
+        actual = run_and_catch(args + ["-d", "1,3,1"])
+        assert actual == "source,status\n{},ok".format(paraffin_fixture.name)
+        assert os.path.isfile(os.path.join(tempdir.name, "paraffin_data_ba.csv"))
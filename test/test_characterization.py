@@ -1,5 +1,7 @@
 import os.path
 import cmath
+
+import pytest
 from numpy import sqrt, pi, array
 
 import libRL
@@ -37,6 +39,17 @@ class TestCharacterization:
         expected = Expectation(filename)
         assert actual.read() == expected.read()
 
+    @pytest.mark.parametrize("ext", [".npy", ".npz"])
+    def test_save_chars_binary(self, paraffin_fixture, tempdir, ext):
+        filepath = os.path.join(tempdir.name, "test_save_chars" + ext)
+        libRL.characterization(paraffin_fixture.name, save=filepath)
+        expected = libRL.characterization(paraffin_fixture.name)
+        actual = libRL.load(filepath)
+        keys = actual.dtype.names if ext == ".npy" else list(actual.keys())
+        assert list(keys) == list(expected.keys())
+        for key, values in expected.items():
+            assert actual[key].tolist() == values
+
     def test_al_tio2(self, al_tio2_fixture):
         expected = Expectation("characterization_al.json")
         actual = libRL.characterization(al_tio2_fixture.name, f_set=(1, 18, 1))
@@ -114,3 +127,78 @@ class TestParity:
             expected = lambdas[key.upper()](farr).tolist()
             actual = chars[key](f)
             assert all(_is_tolerable(e, a) for (e, a) in zip(expected, actual))
+
+
+class TestMemoizedCharacterizations:
+    @pytest.mark.parametrize("override", [None, "x0", "es"])
+    def test_identical(self, material_fixture, override):
+        kwargs = dict(f_set=(1, 18, 0.5), override=override)
+        expected = libRL.characterization(
+            material_fixture.name, memoize=False, **kwargs
+        )
+        actual = libRL.characterization(material_fixture.name, **kwargs)
+        assert actual == expected
+
+    def test_interpolants_evaluated_once(self, paraffin_fixture):
+        calls = []
+
+        def _counted(name, fn):
+            def _fn(f):
+                calls.append(name)
+                return fn(f)
+
+            return _fn
+
+        data = libRL.tools.refactoring.parse.data(paraffin_fixture.name)
+        fns = libRL.tools.refactoring.interpolations(*data)
+        chars = libRL.characterizations.Characterizations(
+            *(_counted(name, fn) for name, fn in zip("abcd", fns))
+        )
+        f_set = [1.0, 2.0, 3.0]
+        memoized = chars.evaluated(f_set)
+        for key in chars._CHARACTERIZATION_MAPPING:
+            assert memoized[key](f_set).tolist() == chars[key](f_set).tolist()
+        assert calls.count("a") > 1
+        calls.clear()
+
+        memoized = chars.evaluated(f_set)
+        for key in chars._CHARACTERIZATION_MAPPING:
+            memoized[key](f_set)
+        assert sorted(calls) == ["a", "b", "c", "d"]
+        assert not memoized.real_refractive_index(f_set).flags["WRITEABLE"]
+
+
+class TestLazyCharacterization:
+    @pytest.mark.parametrize("override", [None, "x0", "es"])
+    def test_to_dict(self, material_fixture, override):
+        kwargs = dict(f_set=(1, 18, 1), override=override)
+        expected = libRL.characterization(material_fixture.name, **kwargs)
+        actual = libRL.characterization(material_fixture.name, lazy=True, **kwargs)
+        assert list(actual.keys()) == list(expected.keys())
+        assert actual.to_dict() == expected
+
+    def test_on_demand(self, paraffin_fixture):
+        actual = libRL.characterization(
+            paraffin_fixture.name, f_set=(1, 18, 1), params=["Qe", "Skd"], lazy=True
+        )
+        assert len(actual) == 3
+        assert actual.computed == []
+        assert actual["f"] is actual.f
+        assert actual["f"].tolist() == libRL.tools.refactoring.parse.f_set(
+            (1, 18, 1), None
+        )
+
+        qe = actual["Qe"]
+        assert actual.computed == ["Qe"]
+        assert actual["Qe"] is qe
+        assert qe.dtype == "float64" and not qe.flags["WRITEABLE"]
+        with pytest.raises(KeyError):
+            actual["Qu"]
+        with pytest.raises(KeyError):
+            libRL.characterization(paraffin_fixture.name, params=["nope"], lazy=True)
+
+    def test_save(self, paraffin_fixture, tempdir):
+        filename = "test_save_chars.csv"
+        filepath = os.path.join(tempdir.name, "lazy_" + filename)
+        libRL.characterization(paraffin_fixture.name, save=filepath, lazy=True)
+        assert LocalFileUtil(filepath).read() == Expectation(filename).read()
@@ -1,3 +1,10 @@
+import os.path
+
+import numpy as np
+
+from .utils import LocalFileUtil
+
+
 class TestMainReflectionLoss:
     def test_main_reflection_loss(self, run_patch_and_catch):
         args, kwargs = run_patch_and_catch(
@@ -12,6 +19,7 @@ class TestMainReflectionLoss:
             "d_set": (0.0, 20.0, 0.1),
             "override": None,
             "save": None,
+            "dtype": None,
         }
 
     def test_defaults(self, run_patch_and_catch):
@@ -26,6 +34,7 @@ class TestMainReflectionLoss:
             "f_set": None,
             "save": None,
             "override": None,
+            "dtype": None,
         }
 
 
@@ -53,6 +62,7 @@ class TestMainBandAnalysis:
             "f_set": (1.0, 18.0, 0.1),
             "save": None,
             "threshold": -10,
+            "dtype": None,
         }
 
     def test_defaults(self, run_patch_and_catch):
@@ -67,6 +77,7 @@ class TestMainBandAnalysis:
             "f_set": None,
             "save": None,
             "threshold": -10,
+            "dtype": None,
         }
 
 
@@ -97,3 +108,54 @@ class TestMainCharacterization:
             "params": ["all"],
             "save": None,
         }
+
+
+class TestMainReflectionLossChunks:
+    def test_chunk_d(self, run_and_catch, material_fixture, tempdir, capsys):
+        filepath = os.path.join(tempdir.name, "test_chunk_d.csv")
+        args = [material_fixture.name, "-f", "1,18,1", "-d", "0,20,1"]
+        expected = run_and_catch(["libRL", "rl", *args])
+
+        assert run_and_catch(["libRL", "rl", *args, "--chunk_d", "3"]) is None
+        streamed = capsys.readouterr().out
+        run_and_catch(["libRL", "rl", *args, "--chunk_d", "3", "-s", filepath])
+        saved = LocalFileUtil(filepath).read()
+
+        assert streamed.splitlines() == saved.splitlines()
+        actual, expected = saved.splitlines(), expected.splitlines()
+        assert actual[0] == expected[0]
+        assert np.allclose(
+            np.loadtxt(actual[1:], delimiter=","),
+            np.loadtxt(expected[1:], delimiter=","),
+            rtol=0,
+            atol=1e-9,
+        )
+
+
+class TestMainDtype:
+    def test_dtype(self, run_and_catch, paraffin_fixture):
+        args = ["libRL", "rl", paraffin_fixture.name, "-f", "1,18,1", "-d", "1,5,1"]
+        expected = run_and_catch(args).splitlines()
+        actual = run_and_catch([*args, "--dtype", "float32"]).splitlines()
+        assert actual[0] == expected[0]
+        assert np.allclose(
+            np.loadtxt(actual[1:], delimiter=","),
+            np.loadtxt(expected[1:], delimiter=","),
+            rtol=0,
+            atol=1e-3,
+        )
+
+
+class TestMainProfile:
+    def test_profile(self, run_and_catch, paraffin_fixture, capsys):
+        args = ["libRL", "rl", paraffin_fixture.name, "-f", "1,3,1", "-d", "1,3,1"]
+        expected = run_and_catch(args)
+        assert capsys.readouterr().err == ""
+        actual = run_and_catch([args[0], "--profile", *args[1:]])
+        assert actual == expected
+        assert "reflection_loss" in capsys.readouterr().err
+
+    def test_profile_without_mode(self, run_and_catch, capsys):
+        assert run_and_catch(["libRL", "--profile"]) is None
+        out = capsys.readouterr()
+        assert "libRL CLI" in out.out and out.err == ""
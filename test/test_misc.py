@@ -1,6 +1,11 @@
+import numpy as np
+
 import libRL
 
-from libRL.tools.f_peak import f_peak
+from libRL.tools.f_peak import f_peak, local_minima
+from libRL.tools.optimal_thickness import golden_section, optimal_thickness
+from libRL.tools.profiling import Profile
+from libRL.tools.refactoring import GridSpec
 from libRL.tools.quarter_wave import power_fn, quarter_wave
 
 from .utils import Expectation
@@ -13,7 +18,58 @@ class TestFPeak:
         actual = {str(i): fn(i) for i in range(1, 5)}
         expected = Expectation("al_tio2_fpeak.json")
         for av, ev in zip(actual.values(), expected.read().values()):
-            assert av == ev
+            assert av.dtype.names == ("RL", "f", "d")
+            assert [list(peak) for peak in av.tolist()] == ev
+
+    def test_f_peak_threads(self, al_tio2_fixture):
+        fn = f_peak(
+            al_tio2_fixture.name, f_set=(1, 18, 0.1), d_set=(0, 5, 0.1), n_threads=3
+        )
+        expected = Expectation("al_tio2_fpeak.json").read()
+        assert [list(peak) for peak in fn(1).tolist()] == expected["1"]
+
+    def test_f_peak_filters(self, al_tio2_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 5, 0.1))
+        peaks = f_peak(al_tio2_fixture.name, **kwargs)(1)
+        deep = f_peak(al_tio2_fixture.name, threshold=-20, **kwargs)(1)
+        assert deep.tolist() == peaks[peaks["RL"] <= -20].tolist()
+        prominent = f_peak(al_tio2_fixture.name, prominence=1, **kwargs)(1)
+        assert 0 < len(prominent) < len(peaks)
+
+    def test_f_peak_refine(self, al_tio2_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 5, 0.1))
+        coarse = f_peak(al_tio2_fixture.name, **kwargs)(1)
+        fn = f_peak(al_tio2_fixture.name, refine=True, **kwargs)
+        refined = fn(1)
+        assert len(refined) == len(coarse)
+        assert fn.evaluations > 0
+        assert all(refined["RL"] <= coarse["RL"])
+        assert all(abs(refined["f"] - coarse["f"]) <= 0.1 + 1e-9)
+        assert all(abs(refined["d"] - coarse["d"]) <= 0.1 + 1e-9)
+
+        # the valley floor at d=1.6 matches a 20x finer grid
+        fine = f_peak(
+            al_tio2_fixture.name, f_set=(12, 14, 0.005), d_set=[1.5, 1.6, 1.7]
+        )
+        (expected,) = fine(1)
+        (actual,) = refined[refined["d"] == 1.6]
+        assert abs(actual["f"] - expected["f"]) < 0.005
+        assert actual["RL"] <= expected["RL"] + 1e-6
+
+    def test_local_minima(self):
+        nan = np.nan
+        grid = np.array(
+            [
+                [0.0, 5.0, 5.0, 5.0, 1.0],
+                [5.0, 1.0, 5.0, 2.0, 5.0],
+                [5.0, 5.0, 5.0, 5.0, nan],
+                [5.0, 4.0, 5.0, 3.0, 5.0],
+            ]
+        )
+        # border cells and cells next to nan are never minima
+        assert np.argwhere(local_minima(grid)).tolist() == [[1, 1], [1, 3]]
+        assert np.argwhere(local_minima(grid, threshold=1)).tolist() == [[1, 1]]
+        assert np.argwhere(local_minima(grid, prominence=4)).tolist() == [[1, 1]]
 
     def test_quarter_wave(self, al_tio2_fixture):
         fn = quarter_wave(al_tio2_fixture.name, f_set=(1, 18, 0.1),)
@@ -22,3 +78,62 @@ class TestFPeak:
     def test_power_fn(self, al_tio2_fixture):
         fn = power_fn(al_tio2_fixture.name, f_set=(1, 18, 0.1), d_set=(0.1, 5, 0.1))
         assert len(fn.d) == len(fn(1))
+
+    def test_power_fn_refine(self, al_tio2_fixture):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0.1, 5, 0.1))
+        fn = power_fn(al_tio2_fixture.name, **kwargs)
+        coarse = fn(1)
+        refined = power_fn(al_tio2_fixture.name, refine=True, **kwargs)(1)
+        assert len(refined) == len(coarse)
+
+        # the refined fit is found from peaks which are no higher than the
+        # coarse ones and lie within a grid step of them
+        coarse_peaks = f_peak(al_tio2_fixture.name, **kwargs)(1)
+        peaks = f_peak(al_tio2_fixture.name, refine=True, **kwargs)(1)
+        assert len(peaks) == len(coarse_peaks)
+        assert all(peaks["RL"] <= coarse_peaks["RL"])
+        assert all(abs(peaks["f"] - coarse_peaks["f"]) <= 0.1 + 1e-9)
+        assert all(abs(peaks["d"] - coarse_peaks["d"]) <= 0.1 + 1e-9)
+
+        # and fits those peaks better than the coarse fit does
+        def residual(curve):
+            return np.sum((np.interp(peaks["d"], fn.d, curve) - peaks["f"]) ** 2)
+
+        assert residual(refined) < residual(coarse)
+
+
+class TestOptimalThickness:
+    def test_optimal_thickness(self, al_tio2_fixture):
+        profile = Profile()
+        results = optimal_thickness(
+            al_tio2_fixture.name, f_set=(1, 18, 0.1), m_set=[1, 2], profile=profile
+        )
+        assert list(results) == [1, 2]
+        for optima in results.values():
+            assert optima.dtype.names == ("RL", "f", "d")
+            assert optima["f"].tolist() == GridSpec(1, 18, 0.1).tolist()
+            assert not np.isnan(optima["d"]).any()
+        assert np.all(results[1]["d"] < results[2]["d"])
+        # tens of evaluations per frequency rather than a dense d_set
+        evaluations = profile.report()["optimal_thickness.band"]["points"]
+        assert evaluations <= 40 * 2 * len(results[1])
+
+    def test_scan_parity(self, al_tio2_fixture):
+        kwargs = dict(f_set=(4, 6, 0.5), d_set=(2, 6, 0.001))
+        (optima,) = optimal_thickness(al_tio2_fixture.name, f_set=(4, 6, 0.5)).values()
+        scan = libRL.reflection_loss(al_tio2_fixture.name, output="array", **kwargs)
+        rl, d = scan["RL"].min(axis=0), scan["d"][scan["RL"].argmin(axis=0)]
+        assert np.all(optima["RL"] <= rl + 1e-6)
+        assert np.allclose(optima["d"], d, rtol=0, atol=0.002)
+
+    def test_golden_section(self):
+        centres = np.array([0.5, 1.0, 2.9, 3.0])
+
+        def fn(x, i):
+            return (x - centres[i]) ** 2
+
+        x, fx, evaluations = golden_section(fn, [0, 0, 0, 0], [3, 3, 3, 10], 1e-8)
+        assert np.allclose(x, centres, rtol=0, atol=1e-7)
+        assert np.allclose(fx, 0, rtol=0, atol=1e-13)
+        # narrower intervals converge in fewer steps
+        assert evaluations[0] < evaluations[3]
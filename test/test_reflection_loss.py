@@ -1,7 +1,14 @@
 import io
 import os.path
 
+import numpy as np
+import pytest
+
 import libRL
+from libRL.reflection_loss import band_reflection_loss
+from libRL.tools.extensions import gamma
+from libRL.tools.refactoring import parse, interpolations, dfind_half
+from libRL.tools.writer import reflection_loss_chunks
 from .utils import LocalFileUtil, Expectation
 
 
@@ -13,6 +20,13 @@ class TestReflectionLoss:
         )
         assert actual == expected.read()
 
+    def test_reflection_loss_threads(self, paraffin_fixture):
+        expected = Expectation("reflection_loss.json")
+        actual = libRL.reflection_loss(
+            paraffin_fixture.name, f_set=(1, 18, 1), d_set=(0, 20, 1), n_threads=4
+        )
+        assert actual == expected.read()
+
     def test_reflection_loss_StringIO(self, material_fixture):
 
         data = io.StringIO(material_fixture.read())
@@ -68,3 +82,414 @@ class TestReflectionLoss:
         actual = LocalFileUtil(filepath)
         expected = Expectation(filename)
         assert actual.read() == expected.read()
+
+    def test_reflection_loss_array(self, paraffin_fixture):
+        expected = Expectation("reflection_loss.json").read()
+        actual = libRL.reflection_loss(
+            paraffin_fixture.name, f_set=(1, 18, 1), d_set=(0, 20, 1), output="array"
+        )
+        assert isinstance(actual["RL"], np.ndarray)
+        assert actual["RL"].shape == (len(expected["d"]), len(expected["f"]))
+        assert actual["RL"].flags["C_CONTIGUOUS"]
+        assert actual["f"].tolist() == expected["f"]
+        assert actual["d"].tolist() == expected["d"]
+        assert np.allclose(actual["RL"], expected["RL"], rtol=0, atol=1e-9)
+
+    def test_reflection_loss_array_eps_set(self, material_fixture):
+        expected = Expectation("reflection_loss_eps_set.json").read()
+        actual = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=[1, 2, 3, 4, 5],
+            d_set=[1, 2, 3, 4, 5],
+            override="es",
+            output="array",
+        )
+        assert np.allclose(actual["RL"], expected["RL"], rtol=0, atol=1e-9)
+
+    def test_reflection_loss_array_chi_zero(self, material_fixture):
+        expected = Expectation("reflection_loss_chi_zero.json").read()
+        actual = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=[1, 2, 3, 4, 5],
+            d_set=[1, 2, 3, 4, 5],
+            override="x0",
+            output="array",
+        )
+        assert np.allclose(actual["RL"], expected["RL"], rtol=0, atol=1e-9)
+
+    @pytest.mark.parametrize("override", ["x0", "es"])
+    def test_reflection_loss_array_override(self, material_fixture, override):
+        kwargs = dict(f_set=(1, 18, 0.5), d_set=(0, 20, 0.5), override=override)
+        expected = libRL.reflection_loss(material_fixture.name, **kwargs)
+        actual = libRL.reflection_loss(
+            material_fixture.name, output="array", n_threads=2, **kwargs
+        )
+        expected = np.array(expected["RL"])
+        finite = np.isfinite(expected)
+        assert np.array_equal(finite, np.isfinite(actual["RL"]))
+        assert np.allclose(actual["RL"][finite], expected[finite], rtol=0, atol=1e-9)
+
+    def test_reflection_loss_array_out(self, paraffin_fixture):
+        out = np.empty((3, 5))
+        kwargs = dict(f_set=[1, 2, 3, 4, 5], d_set=[1, 2, 3], output="array")
+        first = libRL.reflection_loss(paraffin_fixture.name, out=out, **kwargs)
+        second = libRL.reflection_loss(paraffin_fixture.name, **kwargs)
+        assert first["RL"] is out
+        assert np.array_equal(out, second["RL"])
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(paraffin_fixture.name, out=np.empty(3), **kwargs)
+
+    @pytest.mark.parametrize("override", [None, "x0", "es"])
+    def test_reflection_loss_float32(self, material_fixture, override):
+        kwargs = dict(f_set=(1, 18, 0.1), d_set=(0, 20, 0.1), override=override)
+        expected = libRL.reflection_loss(material_fixture.name, **kwargs)
+        actual = libRL.reflection_loss(
+            material_fixture.name, output="array", dtype="float32", **kwargs
+        )
+        assert actual["RL"].dtype == np.float32
+        assert actual["f"].tolist() == expected["f"]
+        assert actual["d"].tolist() == expected["d"]
+        expected = np.array(expected["RL"])
+        rl = actual["RL"].astype(np.float64)
+        # within the documented error bound of 5e-5 / |gamma| dB
+        gamma = 10 ** (expected / 20)
+        bounded = np.isfinite(expected) & (expected > -60) & (expected <= 0)
+        assert np.all(np.abs(rl - expected)[bounded] <= 5e-5 / gamma[bounded])
+        above = np.isfinite(expected) & (expected > 0)
+        assert np.all(np.abs(rl - expected)[above] <= 5e-3)
+
+    def test_reflection_loss_float32_lossy(self):
+        # a lossy material decays by far more than float32's exp range
+        # across the default d_set range
+        f = np.linspace(1, 18, 18)
+        data = [f, 30 + 0 * f, 30 + 0 * f, 2 + 0 * f, 3 + 0 * f]
+        kwargs = dict(f_set=(1, 18, 1), d_set=(0, 20, 0.5), output="array")
+        expected = libRL.reflection_loss(data, **kwargs)["RL"]
+        actual = libRL.reflection_loss(data, dtype="float32", **kwargs)["RL"]
+        assert np.all(np.isfinite(actual))
+        assert np.allclose(actual, expected, rtol=0, atol=1e-4)
+
+    def test_reflection_loss_float32_list(self, paraffin_fixture):
+        kwargs = dict(f_set=[1, 2, 3, 4, 5], d_set=[1, 2, 3])
+        expected = libRL.reflection_loss(
+            paraffin_fixture.name, output="array", dtype="float32", **kwargs
+        )
+        actual = libRL.reflection_loss(paraffin_fixture.name, dtype="float32", **kwargs)
+        assert actual == {
+            "f": [1, 2, 3, 4, 5],
+            "d": [1, 2, 3],
+            "RL": expected["RL"].tolist(),
+        }
+
+    def test_reflection_loss_bad_dtype(self, paraffin_fixture):
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(paraffin_fixture.name, d_set=1, dtype="int32")
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(
+                paraffin_fixture.name,
+                d_set=1,
+                output="array",
+                dtype="float32",
+                out=np.empty((1, 341)),
+            )
+
+    def test_reflection_loss_bad_output(self, paraffin_fixture):
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(paraffin_fixture.name, d_set=1, output="dict")
+
+
+class TestAdaptiveReflectionLoss:
+    @pytest.mark.parametrize(
+        "max_depth, savings, tolerance", [(None, 7, 0.1), (3, 16, 0.25)]
+    )
+    def test_contour(self, material_fixture, max_depth, savings, tolerance):
+        # the accuracy documented for output='adaptive' in reflection_loss
+        dense = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=(1, 18, 0.05),
+            d_set=(0, 20, 0.05),
+            output="array",
+        )
+        kwargs = {} if max_depth is None else dict(max_depth=max_depth)
+        grid = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=(1, 19, 1),
+            d_set=(0, 21, 1),
+            output="adaptive",
+            **kwargs,
+        )
+        assert grid.evaluations * savings < dense["RL"].size
+
+        resampled = grid.resample(dense["f"], dense["d"])
+        assert resampled.shape == dense["RL"].shape
+        assert not np.isnan(resampled).any()
+
+        expected, actual = dense["RL"] <= -10, resampled <= -10
+        assert (expected != actual).mean() < 0.005
+        bandwidth_error = np.abs(expected.sum(axis=1) - actual.sum(axis=1)) * 0.05
+        assert bandwidth_error.max() <= tolerance + 1e-9
+
+    def test_save(self, material_fixture, tempdir):
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(
+                material_fixture.name,
+                f_set=(1, 19, 1),
+                d_set=(0, 21, 1),
+                output="adaptive",
+                save=os.path.join(tempdir.name, "adaptive.csv"),
+            )
+
+    @pytest.mark.parametrize("f_set, d_set", [((1, 19, 1), [5]), ((1, 2, 1), None)])
+    def test_single_node(self, material_fixture, f_set, d_set):
+        # a grid needs two nodes per axis to have any cells
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(
+                material_fixture.name, f_set=f_set, d_set=d_set, output="adaptive"
+            )
+
+    def test_sampled_points(self, material_fixture):
+        grid = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=(1, 19, 1),
+            d_set=(0, 21, 1),
+            output="adaptive",
+            max_depth=2,
+        )
+        fns = interpolations(*parse.data(material_fixture.name))
+        expected = [
+            gamma([f], [d], *[[fn(f)] for fn in fns])[0][0]
+            for f, d in zip(grid.f[::50], grid.d[::50])
+        ]
+        assert np.allclose(grid.RL[::50], expected)
+
+        points = set(zip(grid.f.tolist(), grid.d.tolist()))
+        assert len(points) == grid.evaluations
+        for cell in grid.cells:
+            for f in (cell["f_min"], cell["f_max"]):
+                for d in (cell["d_min"], cell["d_max"]):
+                    assert (f, d) in points
+        assert grid.cells["depth"].max() == 2
+
+    def test_no_refinement(self, material_fixture):
+        grid = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=(1, 19, 1),
+            d_set=(0, 21, 1),
+            output="adaptive",
+            tol=np.inf,
+            threshold=None,
+        )
+        assert grid.evaluations == 18 * 21
+        assert len(grid.cells) == 17 * 20
+        assert (grid.cells["depth"] == 0).all()
+
+
+class TestBandReflectionLoss:
+    """the band engine should reproduce the per-frequency loop it replaced."""
+
+    def _old_results(self, data, f_set, d_set, m, override=None):
+        f, e1, e2, mu1, mu2 = parse.data(data)
+        fns = interpolations(f, e1, e2, mu1, mu2, "cubic", override)
+        results = []
+        for f in f_set:
+            d_min = dfind_half(*fns, f, m)
+            d_max = dfind_half(*fns, f, m + 1)
+            d_vals = [d for d in d_set if d_min <= d <= d_max]
+            results.extend(gamma([f], d_vals, *[list(map(fn, [f])) for fn in fns]))
+        return results
+
+    @pytest.mark.parametrize("override", [None, "x0", "es"])
+    def test_parity(self, material_fixture, override):
+        f_set = parse.f_set((1, 18, 0.1), None)
+        d_set = parse.d_set((0, 20, 0.1))
+        fn = band_reflection_loss(
+            material_fixture.name, f_set=f_set, d_set=d_set, override=override
+        )
+        for m in (1, 2, 3):
+            expected = self._old_results(
+                material_fixture.name, f_set, d_set, m, override
+            )
+            assert fn(m) == expected
+
+    def test_unsorted_thickness(self, material_fixture):
+        kwargs = dict(f_set=(1, 18, 0.5))
+        d_set = [float(d) for d in range(20)]
+        fn = band_reflection_loss(material_fixture.name, d_set=d_set, **kwargs)
+        shuffled = band_reflection_loss(
+            material_fixture.name, d_set=d_set[::-1], **kwargs
+        )
+        assert sorted(fn(2)) == sorted(shuffled(2))
+        assert fn.engine.bounds(2) is fn.engine.bounds(2)
+
+    @pytest.mark.parametrize("override", [None, "x0", "es"])
+    def test_multi_band_parity(self, material_fixture, override):
+        fn = band_reflection_loss(
+            material_fixture.name,
+            f_set=(1, 18, 0.1),
+            d_set=(0, 20, 0.05),
+            override=override,
+        )
+        engine = fn.engine
+        m_set = [1, 2, 3, 5]
+        actual = engine.bands(m_set)
+        assert list(actual.keys()) == m_set
+        for m in m_set:
+            for a, e in zip(actual[m], engine.cells(m)):
+                assert np.array_equal(a, e)
+
+    def test_multi_band_on_bounds(self, material_fixture):
+        fn = band_reflection_loss(material_fixture.name, f_set=(1, 18, 1), d_set=1)
+        bounds = [fn.engine.bounds(m) for m in (1, 2, 3, 4)]
+        d_set = sorted(set(np.concatenate(bounds).tolist()))
+        engine = band_reflection_loss(
+            material_fixture.name, f_set=(1, 18, 1), d_set=d_set
+        ).engine
+        actual = engine.bands([1, 2, 3])
+        for m in (1, 2, 3):
+            for a, e in zip(actual[m], engine.cells(m)):
+                assert np.array_equal(a, e)
+
+    def test_multi_band_fractional(self, material_fixture):
+        engine = band_reflection_loss(
+            material_fixture.name, f_set=(1, 18, 1), d_set=(0, 10, 0.5)
+        ).engine
+        actual = engine.bands([1.5])
+        for a, e in zip(actual[1.5], engine.cells(1.5)):
+            assert np.array_equal(a, e)
+
+
+class TestIterChunks:
+    kwargs = dict(f_set=(1, 18, 0.5), d_set=(0, 20, 0.5))
+
+    def test_iter_chunks(self, material_fixture):
+        expected = libRL.reflection_loss(
+            material_fixture.name, output="array", **self.kwargs
+        )
+        chunks = list(
+            libRL.reflection_loss.iter_chunks(
+                material_fixture.name, chunk_d=7, **self.kwargs
+            )
+        )
+        assert [len(d_slice) for d_slice, _ in chunks] == [7] * 5 + [5]
+        for d_slice, rl_block in chunks:
+            assert rl_block.shape == (len(d_slice), len(expected["f"]))
+        assert np.array_equal(np.concatenate([d for d, _ in chunks]), expected["d"])
+        assert np.array_equal(np.vstack([rl for _, rl in chunks]), expected["RL"])
+
+    def test_bad_chunk_d(self, material_fixture):
+        with pytest.raises(ValueError):
+            next(libRL.reflection_loss.iter_chunks(material_fixture.name, chunk_d=0))
+
+    def test_save_chunks(self, material_fixture, tempdir):
+        expected_path = os.path.join(tempdir.name, "test_save_chunks_expected.csv")
+        libRL.reflection_loss(
+            material_fixture.name, output="array", save=expected_path, **self.kwargs
+        )
+        data = parse.data(material_fixture.name)
+        f_set = parse.f_set(self.kwargs["f_set"], data[0])
+        d_set = parse.d_set(self.kwargs["d_set"])
+        chunks = libRL.reflection_loss.iter_chunks(data, f_set, d_set, chunk_d=6)
+
+        actual = io.StringIO()
+        reflection_loss_chunks(f_set, d_set, chunks, actual, rows=5)
+        actual = actual.getvalue().splitlines()
+        expected = LocalFileUtil(expected_path).read().splitlines()
+
+        assert actual[0] == expected[0]
+        assert np.array_equal(
+            np.loadtxt(actual[1:], delimiter=","),
+            np.loadtxt(expected[1:], delimiter=","),
+        )
+
+
+class TestBinaryFormats:
+    kwargs = dict(f_set=(1, 18, 0.5), d_set=(0, 20, 0.5))
+
+    @pytest.mark.parametrize("ext", [".npy", ".npz"])
+    def test_save(self, material_fixture, tempdir, ext):
+        filepath = os.path.join(tempdir.name, "test_save_binary" + ext)
+        expected = libRL.reflection_loss(
+            material_fixture.name, save=filepath, **self.kwargs
+        )
+        actual = libRL.load(filepath)
+        assert actual["f"].tolist() == expected["f"]
+        assert actual["d"].tolist() == expected["d"]
+        assert actual["RL"].tolist() == expected["RL"]
+
+    def test_load_memory_mapped(self, material_fixture, tempdir):
+        filepath = os.path.join(tempdir.name, "test_load_memory_mapped.npy")
+        libRL.reflection_loss(material_fixture.name, save=filepath, **self.kwargs)
+        actual = libRL.load(filepath)
+        for key in ("f", "d", "RL"):
+            assert isinstance(actual[key], np.memmap)
+            assert not actual[key].flags["WRITEABLE"]
+
+    @pytest.mark.parametrize("ext", [".npy", ".npz", ".csv"])
+    def test_save_chunks(self, material_fixture, tempdir, ext):
+        expected_path = os.path.join(tempdir.name, "test_chunks_expected" + ext)
+        actual_path = os.path.join(tempdir.name, "test_chunks_actual" + ext)
+        libRL.reflection_loss(
+            material_fixture.name, output="array", save=expected_path, **self.kwargs
+        )
+        data = parse.data(material_fixture.name)
+        f_set = parse.f_set(self.kwargs["f_set"], data[0])
+        d_set = parse.d_set(self.kwargs["d_set"])
+        chunks = libRL.reflection_loss.iter_chunks(data, f_set, d_set, chunk_d=6)
+        reflection_loss_chunks(f_set, d_set, chunks, actual_path)
+        if ext == ".csv":
+            assert LocalFileUtil(actual_path).read() == LocalFileUtil(
+                expected_path
+            ).read()
+        else:
+            expected, actual = libRL.load(expected_path), libRL.load(actual_path)
+            for key in ("f", "d", "RL"):
+                assert np.array_equal(actual[key], expected[key])
+
+    def test_mmap_float32(self, material_fixture, tempdir):
+        filepath = os.path.join(tempdir.name, "test_mmap_float32.npy")
+        kwargs = dict(f_set=(1, 18, 0.5), d_set=(0, 20, 0.5), dtype="float32")
+        expected = libRL.reflection_loss(
+            material_fixture.name, output="array", **kwargs
+        )
+        actual = libRL.reflection_loss(
+            material_fixture.name, save=filepath, mmap=True, chunk_d=7, **kwargs
+        )
+        assert actual["RL"].dtype == np.float64
+        assert np.array_equal(actual["RL"], expected["RL"])
+        assert np.array_equal(actual["f"], expected["f"])
+        assert np.array_equal(actual["d"], expected["d"])
+
+    @pytest.mark.parametrize("ext", [".npy", ".npz"])
+    def test_save_float32_axes(self, material_fixture, tempdir, ext):
+        filepath = os.path.join(tempdir.name, "test_save_float32" + ext)
+        result = libRL.reflection_loss(
+            material_fixture.name,
+            f_set=(1, 18, 0.1),
+            d_set=(0, 20, 0.1),
+            output="array",
+            dtype="float32",
+            save=filepath,
+        )
+        actual = libRL.load(filepath)
+        assert np.array_equal(actual["f"], result["f"])
+        assert np.array_equal(actual["d"], result["d"])
+        assert np.array_equal(actual["RL"], result["RL"])
+
+    def test_mmap(self, material_fixture, tempdir):
+        filepath = os.path.join(tempdir.name, "test_mmap.npy")
+        expected = libRL.reflection_loss(
+            material_fixture.name, output="array", **self.kwargs
+        )
+        actual = libRL.reflection_loss(
+            material_fixture.name, save=filepath, mmap=True, chunk_d=7, **self.kwargs
+        )
+        assert isinstance(actual["RL"], np.memmap)
+        for key in ("f", "d", "RL"):
+            assert np.array_equal(actual[key], expected[key])
+
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(material_fixture.name, mmap=True, **self.kwargs)
+        with pytest.raises(ValueError):
+            libRL.reflection_loss(
+                material_fixture.name, save="rl.csv", mmap=True, **self.kwargs
+            )
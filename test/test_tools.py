@@ -1,9 +1,38 @@
+import array
+import io
 import math
+import os.path
+import pathlib
 
+import numpy as np
+import pytest
+
+import libRL
 from libRL.__main__ import _fdm_format
-from libRL.tools.extensions import gamma, test_extension
+from libRL.tools import profiling, redundancies
+from libRL.tools.extensions import gamma, gamma_cells, gamma_into, test_extension
 from libRL.tools.redundancies import gamma as py_gamma
-from libRL.tools.refactoring import parse
+from libRL.tools.vectorized import (
+    MAX_THREADS,
+    gamma_layer,
+    gamma_layer_into,
+    gamma_values,
+    layer_terms,
+)
+from libRL.tools.caching import (
+    CacheInfo,
+    LRUCache,
+    content_key,
+    data_cache,
+    interpolation_cache,
+)
+from libRL.tools.refactoring import (
+    GridSpec,
+    parse,
+    interpolations,
+    precision,
+    stepwise,
+)
 
 from .utils import Expectation
 
@@ -40,6 +69,143 @@ class TestExtensions:
             assert (f, d) == (0, 0)
 
 
+class TestGammaInto:
+    params = [[1, 2], [1, 2, 3], [4, 3], [1, 0.5], [1.1, 1], [0.1, 0]]
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_ndarray(self, fn):
+        arrays = [np.array(p, dtype=np.float64) for p in self.params]
+        out = np.empty((3, 2))
+        assert fn(*arrays, out) is out
+        expected = py_gamma(*self.params)
+        assert all(_is_tolerable(a, b) for a, (b, _, _) in zip(out.ravel(), expected))
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_buffers(self, fn):
+        buffers = [memoryview(array.array("d", p)) for p in self.params]
+        out = array.array("d", [0.0] * 6)
+        fn(*buffers, out, False)
+        expected = np.empty(6)
+        fn(*[np.array(p, dtype=np.float64) for p in self.params], expected)
+        assert list(out) == expected.tolist()
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_errors(self, fn):
+        arrays = [np.array(p, dtype=np.float64) for p in self.params]
+        with pytest.raises(ValueError):
+            fn(*arrays, np.empty(5))
+        with pytest.raises(ValueError):
+            fn(arrays[0], arrays[1], arrays[2][:1], *arrays[3:], np.empty(6))
+        with pytest.raises(TypeError):
+            fn(np.array([1, 2]), *arrays[1:], np.empty(6))
+        with pytest.raises(ValueError):
+            fn(*arrays, np.empty((6, 2))[:, 0])
+        with pytest.raises(TypeError):
+            fn(*arrays, np.empty(6, dtype=np.float32))
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_float32(self, fn):
+        arrays = [np.array(p, dtype=np.float64) for p in self.params]
+        expected = fn(*arrays, np.empty((3, 2)))
+        out = np.empty((3, 2), dtype=np.float32)
+        assert fn(*[a.astype(np.float32) for a in arrays], out) is out
+        assert np.allclose(out, expected, rtol=0, atol=1e-3)
+        buffers = [memoryview(array.array("f", p)) for p in self.params]
+        actual = fn(*buffers, array.array("f", [0.0] * 6))
+        assert actual.tolist() == out.ravel().tolist()
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_float32_thick(self, fn):
+        # alpha * d reaches thousands, far beyond where float32 exp overflows
+        f, d = np.array([18.0]), np.linspace(0.01, 200, 2000)
+        params = [np.array([p], dtype=np.float64) for p in (10, 8, 1, 2)]
+        expected = fn(f, d, *params, np.empty(len(d)))
+        single = [p.astype(np.float32) for p in (f, d, *params)]
+        actual = fn(*single, np.empty(len(d), dtype=np.float32))
+        assert np.all(np.isfinite(actual))
+        assert np.allclose(actual, expected, rtol=0, atol=1e-4)
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    @pytest.mark.parametrize("e2_sign", [1, -1])
+    def test_layer_kernel(self, fn, e2_sign):
+        # the grid is computed per frequency from exp(-2kd) rather than tanh,
+        # i.e. for d = 0, thick layers and gaining (e'' < 0) materials
+        f = np.linspace(0.5, 18, 71)
+        d = np.concatenate([[0.0], np.linspace(0.01, 20, 49), [500.0]])
+        e1, e2 = 10 - 0.2 * f, e2_sign * (2 + 0.05 * f)
+        mu1, mu2 = 1.2 - 0.01 * f, 0.3 - 0.01 * f
+        params = [p.tolist() for p in (f, d, e1, e2, mu1, mu2)]
+        expected = np.array([rl for rl, _, _ in gamma(*params)])
+        actual = fn(f, d, e1, e2, mu1, mu2, np.empty(len(f) * len(d)))
+        finite = np.isfinite(expected)
+        assert np.array_equal(finite, np.isfinite(actual))
+        assert np.allclose(actual[finite], expected[finite], rtol=0, atol=1e-9)
+
+
+class TestGammaCells:
+    @pytest.mark.parametrize("fn", [gamma_cells, redundancies.gamma_cells])
+    def test_cells(self, fn):
+        f, d, e1, e2, mu1, mu2 = [1, 2], [1, 2, 3], [4, 3], [1, 0.5], [1.1, 1], [0.1, 0]
+        grid = py_gamma(f, d, e1, e2, mu1, mu2)
+        f_i, d_i = np.array([0, 1, 1, 0]), np.array([2, 0, 1, 1])
+        cells = [np.array(p, dtype=np.float64)[f_i] for p in (f, e1, e2, mu1, mu2)]
+        d_cells = np.array(d, dtype=np.float64)[d_i]
+        out = fn(cells[0], d_cells, *cells[1:], np.empty(4), True, 2)
+        expected = [grid[di * len(f) + fi][0] for fi, di in zip(f_i, d_i)]
+        assert all(_is_tolerable(a, b) for a, b in zip(out, expected))
+        with pytest.raises(ValueError):
+            fn(cells[0], d_cells, *cells[1:], np.empty(3))
+
+        single = [c.astype(np.float32) for c in (cells[0], d_cells, *cells[1:])]
+        out32 = fn(*single, np.empty(4, dtype=np.float32))
+        assert out32.dtype == np.float32
+        assert np.allclose(out32, out, rtol=0, atol=1e-3)
+
+
+class TestThreads:
+    params = [
+        list(np.linspace(1, 18, 37)),
+        list(np.linspace(0, 20, 41)),
+        list(np.linspace(4, 3, 37)),
+        list(np.linspace(1, 0.5, 37)),
+        list(np.linspace(1.1, 1, 37)),
+        list(np.linspace(0.1, 0, 37)),
+    ]
+
+    def test_gamma_threads(self):
+        serial = gamma(*self.params)
+        for n_threads in (2, 3, 8, 64):
+            assert gamma(*self.params, n_threads) == serial
+
+    @pytest.mark.parametrize("fn", [gamma_into, redundancies.gamma_into])
+    def test_gamma_into_threads(self, fn):
+        arrays = [np.array(p) for p in self.params]
+        serial = fn(*arrays, np.empty((41, 37)))
+        for n_threads in (2, 3, 8, 64, 10 ** 6):
+            threaded = fn(*arrays, np.empty((41, 37)), True, n_threads)
+            assert np.array_equal(threaded, serial, equal_nan=True)
+
+    def test_parse_n_threads(self, monkeypatch):
+        monkeypatch.delenv("LIBRL_NUM_THREADS", raising=False)
+        assert parse.n_threads() == 1
+        assert parse.n_threads(4) == 4
+        assert parse.n_threads("auto") == parse.n_threads(0) >= 1
+        monkeypatch.setenv("LIBRL_NUM_THREADS", "3")
+        assert parse.n_threads() == 3
+        assert parse.n_threads(2) == 2
+        with pytest.raises(ValueError):
+            parse.n_threads(-1)
+        with pytest.raises(ValueError):
+            parse.n_threads("many")
+        # non-integral counts are rejected rather than truncated
+        assert parse.n_threads(2.0) == 2
+        with pytest.raises(ValueError):
+            parse.n_threads(2.7)
+        with pytest.raises(ValueError):
+            parse.n_threads("2.7")
+        assert parse.n_threads(10 ** 6) == MAX_THREADS
+
+
 class TestRedundancies:
     def test_equivalence(self):
         f, d, e1, e2, mu1, mu2 = [[1, 1], [1, 1], [1, 1], [1, 1], [1, 1], [1, 1]]
@@ -63,8 +229,282 @@ class TestRedundancies:
             assert _is_tolerable(a, b)
 
 
+class TestVectorized:
+    def test_equivalence(self):
+        f, d, e1, e2, mu1, mu2 = [
+            [1, 2],
+            [1, 2, 3, 4, 5],
+            [4, 3],
+            [1, 0.5],
+            [1.1, 1],
+            [0.1, 0],
+        ]
+        expected = py_gamma(f, d, e1, e2, mu1, mu2)
+        actual = gamma_values(f, np.array(d)[:, np.newaxis], e1, e2, mu1, mu2)
+        assert actual.shape == (len(d), len(f))
+        for (a, (b, _, _)) in zip(actual.ravel(), expected):
+            assert _is_tolerable(a, b)
+
+    def test_layer(self):
+        f = np.linspace(1, 18, 35)
+        d = np.linspace(0, 20, 41)
+        e1, e2 = 10 - 0.2 * f, 2 + 0.05 * f
+        mu1, mu2 = 1.2 - 0.01 * f, 0.3 - 0.01 * f
+        expected = gamma_values(f, d[:, np.newaxis], e1, e2, mu1, mu2)
+        actual = gamma_layer(*layer_terms(f, e1, e2, mu1, mu2), d)
+        assert actual.shape == expected.shape
+        finite = np.isfinite(expected)
+        assert np.array_equal(finite, np.isfinite(actual))
+        assert np.allclose(actual[finite], expected[finite], rtol=0, atol=1e-9)
+
+    def test_layer_terms_unit_mu(self):
+        f = np.linspace(1, 18, 35)
+        e1, e2 = 10 - 0.2 * f, 2 + 0.05 * f
+        ones, zeros = np.ones_like(f), np.zeros_like(f)
+        expected = layer_terms(f, e1, e2, ones + 1e-300, zeros)
+        actual = layer_terms(f, e1, e2, ones, zeros)
+        for a, e in zip(actual, expected):
+            assert np.allclose(a, e, rtol=1e-12, atol=0)
+
+    def test_layer_into_threads(self):
+        f = np.linspace(1, 18, 35)
+        d = np.linspace(0.5, 20, 40)
+        params = (10 - 0.2 * f, 2 + 0.05 * f, np.ones_like(f), np.zeros_like(f))
+        expected = gamma_layer(*layer_terms(f, *params), d)
+        out = np.empty((len(d), len(f)))
+        assert gamma_layer_into(f, d, *params, out, n_threads=3) is out
+        assert np.array_equal(out, expected)
+        with pytest.raises(ValueError):
+            gamma_layer_into(f, d, *params, np.empty(len(f)))
+
+
 class TestRefactors:
     def test_parse(self, paraffin_fixture):
         actual = parse.data(paraffin_fixture.name)
         expected = Expectation("test_parse.json")
-        assert actual == expected.read()
+        assert all(column.dtype == np.float64 for column in actual)
+        assert [column.tolist() for column in actual] == expected.read()
+
+    def test_parse_inputs(self, paraffin_fixture):
+        expected = Expectation("test_parse.json").read()
+        with open(paraffin_fixture.name, "rb") as f:
+            contents = f.read()
+        with open(paraffin_fixture.name, "rb") as f:
+            from_file = parse.data(f)
+        for actual in (
+            parse.data(pathlib.Path(paraffin_fixture.name)),
+            parse.data(contents),
+            from_file,
+            parse.data(io.StringIO(contents.decode())),
+            parse.data(np.array(expected)),
+            parse.data(expected),
+        ):
+            assert [column.tolist() for column in actual] == expected
+        with pytest.raises(ValueError):
+            parse.data(1)
+
+    def test_parse_fallback(self):
+        text = "f,e1,e2,mu1,mu2\n1,2,3,4,5\nfooter\n2,3,4,5,6\n3,4,,6,7\n"
+        expected = [[1.0, 2.0], [2.0, 3.0], [3.0, 4.0], [4.0, 5.0], [5.0, 6.0]]
+        assert [column.tolist() for column in parse.data(text.encode())] == expected
+        assert parse.data(b"no,numbers,here\n") == []
+
+    def test_parse_f_set(self, paraffin_fixture):
+        f, *_ = parse.data(paraffin_fixture.name)
+        assert parse.f_set(None, f) == f.tolist()
+
+    def test_grid_spec(self):
+        spec = GridSpec(1, 2, 0.1)
+        assert spec.tolist() == [1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9]
+        assert spec.values().dtype == np.float64
+        assert spec.values().tolist() == spec.tolist()
+        assert (spec.step, spec.precision, spec.size) == (0.1, 1, 10)
+        assert hash(spec) == hash(GridSpec(1, 2, 0.1)) == hash((1, 2, 0.1))
+        # without a step the grid is a range of integers
+        assert GridSpec(1, 5).tolist() == [1, 2, 3, 4]
+        assert GridSpec(1, 5).precision == 0
+        assert stepwise(1, 2, 0.1) == spec.tolist()
+        assert stepwise(1, 5) == [1, 2, 3, 4]
+
+        # counts and values are found in exact decimals, so aren't affected
+        # by 19.95 / 0.05 being 398.999...
+        assert GridSpec(0.05, 20, 0.05).size == 399
+        assert GridSpec(0.05, 20, 0.05).tolist()[-1] == 19.95
+        assert GridSpec(2.02, 3.02, 0.2).tolist() == [2.02, 2.22, 2.42, 2.62, 2.82]
+        assert GridSpec(0, 1e-4, 1e-05).precision == 5
+        assert GridSpec(0, 1e-4, 1e-05).tolist()[-1] == 9e-05
+
+        # a float artifact step has 17 places, which overflow int64 once scaled
+        spec = GridSpec(0, 100, 0.1 + 0.2)
+        assert spec.precision == 17
+        values = spec.values()
+        assert len(values) == 333
+        assert np.all(np.diff(values) > 0)
+        assert np.allclose(values, np.arange(333) * 0.3, rtol=1e-15, atol=1e-12)
+        assert parse.f_set(spec, None) == values.tolist()
+
+    def test_grid_spec_parse(self, paraffin_fixture):
+        spec = GridSpec(1, 18, 0.5)
+        assert parse.f_set(spec, None) == parse.f_set((1, 18, 0.5), None)
+        assert parse.d_set(GridSpec(0, 5, 0.1)) == parse.d_set((0, 5, 0.1))
+        assert parse.m_set(GridSpec(1, 5)) == [1, 2, 3, 4]
+        expected = libRL.reflection_loss(
+            paraffin_fixture.name, f_set=(1, 18, 0.5), d_set=(0, 5, 0.1)
+        )
+        actual = libRL.reflection_loss(
+            paraffin_fixture.name, f_set=spec, d_set=GridSpec(0, 5, 0.1)
+        )
+        assert actual == expected
+
+    def test_precision(self):
+        assert precision([1.0, 1.1, 1.2, 1.25]) == 1
+        assert precision([1, 2, 3]) == 1
+        assert precision([1e-05, 2e-05, 0.5]) == 5
+
+
+class TestCaching:
+    @pytest.fixture(autouse=True)
+    def default_size(self):
+        # the cache size is read from LIBRL_CACHE_SIZE once, on import, so the
+        # caches are set to the default size for each test and then restored
+        sizes = [c.cache_info().maxsize for c in (data_cache, interpolation_cache)]
+        for cache in (data_cache, interpolation_cache):
+            cache.resize(32)
+        yield
+        for cache, size in zip((data_cache, interpolation_cache), sizes):
+            cache.resize(size)
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        assert cache.get("a", lambda: 1) == 1
+        assert cache.get("a", lambda: 2) == 1
+        cache.get("b", lambda: 3)
+        cache.get("c", lambda: 4)
+        assert cache.get("a", lambda: 5) == 5
+        assert cache.cache_info() == CacheInfo(1, 4, 2, 2)
+        cache.resize(1)
+        assert cache.cache_info().currsize == 1
+        with pytest.raises(ValueError):
+            cache.resize(-1)
+        cache.resize(0)
+        cache.get("d", lambda: 6)
+        assert cache.cache_info().currsize == 0
+        cache.cache_clear()
+        assert cache.cache_info() == CacheInfo(0, 0, 0, 0)
+
+    def test_content_key(self):
+        assert content_key([1, 2], [3.0], extra=("cubic", None)) == content_key(
+            np.array([1.0, 2.0]), np.array([3]), extra=("cubic", None)
+        )
+        assert content_key([1, 2], [3]) != content_key([1, 2], [4])
+        assert content_key([1, 2], [3]) != content_key([1, 2, 3])
+
+    def test_interpolation_cache(self, paraffin_fixture):
+        data = parse.data(paraffin_fixture.name)
+        interpolation_cache.cache_clear()
+        first = interpolations(*data, "cubic", None)
+        second = interpolations(*data, "cubic", None)
+        assert first == second and first is not second
+        assert interpolations(*data, "linear", None) != first
+        assert interpolations(*data, "cubic", "x0")[2] is not first[2]
+        uncached = interpolations(*data, "cubic", None, cache=False)
+        assert uncached[0] is not first[0]
+        assert interpolation_cache.cache_info() == CacheInfo(1, 3, 32, 3)
+        interpolation_cache.cache_clear()
+
+    def test_data_cache(self, paraffin_fixture, tempdir):
+        filepath = os.path.join(tempdir.name, "cached.csv")
+        with open(filepath, "w") as f:
+            f.write("f,e1,e2,mu1,mu2\n1,2,3,4,5\n")
+        data_cache.cache_clear()
+        first = parse.data(filepath)
+        first[0][0] = 10
+        assert [c.tolist() for c in parse.data(filepath)] == [[1], [2], [3], [4], [5]]
+        assert data_cache.cache_info().hits == 1
+        with open(filepath, "w") as f:
+            f.write("f,e1,e2,mu1,mu2\n1,2,3,4,5\n2,3,4,5,6\n")
+        assert len(parse.data(filepath)[0]) == 2
+        assert len(parse.data(filepath, cache=False)[0]) == 2
+        assert data_cache.cache_info().misses == 2
+
+    def test_entry_points(self, paraffin_fixture):
+        libRL.reflection_loss(paraffin_fixture.name, d_set=1, cache=False)
+        interpolation_cache.cache_clear()
+        libRL.reflection_loss(paraffin_fixture.name, d_set=1)
+        libRL.characterization(paraffin_fixture.name, params=["Qe"])
+        assert interpolation_cache.cache_info().hits == 1
+
+
+class TestProfiling:
+    def test_disabled(self, monkeypatch):
+        monkeypatch.delenv("LIBRL_PROFILE", raising=False)
+        assert profiling.stage("gamma") is profiling.stage("other")
+        with profiling.session("entry") as record:
+            record.points = 10
+        assert profiling._active.get() is None
+
+    def test_profile_instance(self, paraffin_fixture):
+        profile = profiling.Profile()
+        libRL.reflection_loss(
+            paraffin_fixture.name,
+            f_set=(1, 18, 1),
+            d_set=(0, 20, 1),
+            profile=profile,
+            cache=False,
+        )
+        report = profile.report()
+        assert list(report)[0] == "reflection_loss"
+        for name in ("parse", "interpolate.fit", "gamma", "group"):
+            assert report[name]["calls"] == 1
+        assert report["gamma"]["points"] == 17 * 20
+        assert report["reflection_loss"]["seconds"] >= report["gamma"]["seconds"]
+        assert "gamma" in str(profile)
+
+    def test_callback(self, material_fixture):
+        reports = []
+        _f_peak = libRL.tools.f_peak.f_peak(
+            material_fixture.name,
+            f_set=(1, 18, 0.5),
+            d_set=(0, 20, 0.5),
+            profile=reports.append,
+        )
+        _f_peak(1)
+        assert [list(r.stages)[0] for r in reports] == ["f_peak", "f_peak.band"]
+        assert reports[1].stages["gamma"]["calls"] == 1
+
+    def test_nested_entry_points(self, material_fixture):
+        profile = profiling.Profile()
+        libRL.band_analysis(
+            material_fixture.name, d_set=(1, 5, 0.5), m_set=[1, 2], profile=profile
+        )
+        assert profile.stages["band_analysis"]["calls"] == 1
+        assert profile.stages["band_reflection_loss"]["calls"] == 1
+        assert profile.stages["bandwidth"]["calls"] == 2
+
+    def test_iter_chunks(self, paraffin_fixture):
+        profile = profiling.Profile()
+        chunks = libRL.reflection_loss.iter_chunks(
+            paraffin_fixture.name, d_set=(0, 20, 1), chunk_d=6, profile=profile
+        )
+        for _ in chunks:
+            assert profiling._active.get() is None
+        assert profile.stages["reflection_loss.iter_chunks"]["calls"] == 5
+        assert profile.stages["gamma"]["calls"] == 4
+
+    def test_iter_chunks_closed_early(self, paraffin_fixture):
+        reports = []
+        chunks = libRL.reflection_loss.iter_chunks(
+            paraffin_fixture.name, d_set=(0, 20, 1), chunk_d=6, profile=reports.append
+        )
+        next(chunks)
+        assert reports == []
+        chunks.close()
+        (report,) = reports
+        assert report.stages["gamma"]["calls"] == 1
+
+    def test_environment(self, paraffin_fixture, monkeypatch, capsys):
+        monkeypatch.setenv("LIBRL_PROFILE", "1")
+        libRL.characterization(paraffin_fixture.name, params=["Qe"])
+        assert "characterize" in capsys.readouterr().err
+        libRL.characterization(paraffin_fixture.name, params=["Qe"], profile=False)
+        assert capsys.readouterr().err == ""